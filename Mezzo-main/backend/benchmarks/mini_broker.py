@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""最小化 MQTT 3.1.1 broker (僅供本機基準測試)
+
+支援 CONNECT / PUBLISH (QoS 0、1) / PUBACK / SUBSCRIBE / UNSUBSCRIBE / PINGREQ / DISCONNECT，
+主題萬用字元 + 與 #。不支援 QoS 2、retained 消息、will 與 session 保存。
+在背景執行緒中執行 asyncio 事件迴圈，啟動後由 port 屬性取得實際埠號。
+需將 backend 目錄加入 sys.path (run_benchmarks.py 會處理)。
+"""
+import asyncio
+import struct
+import threading
+
+from traffic_log import topic_matches
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def _encode_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def _packet(packet_type, flags, body):
+    return bytes(((packet_type << 4) | flags,)) + _encode_length(len(body)) + body
+
+
+def _string(data, offset):
+    length = struct.unpack_from('!H', data, offset)[0]
+    start = offset + 2
+    return data[start:start + length].decode('utf-8'), start + length
+
+
+class _Session:
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.subscriptions = set()
+        self.next_mid = 1
+
+    async def read_packet(self):
+        header = await self.reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7f) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b''
+        return header[0] >> 4, header[0] & 0x0f, body
+
+    def send(self, data):
+        self.writer.write(data)
+
+    def deliver(self, topic, payload, qos):
+        topic_bytes = topic.encode('utf-8')
+        body = struct.pack('!H', len(topic_bytes)) + topic_bytes
+        if qos:
+            body += struct.pack('!H', self.next_mid)
+            self.next_mid = self.next_mid % 0xffff + 1
+        self.send(_packet(PUBLISH, qos << 1, body + payload))
+
+    async def run(self):
+        try:
+            while True:
+                packet_type, flags, body = await self.read_packet()
+
+                if packet_type == CONNECT:
+                    self.broker.stats['connects'] += 1
+                    self.send(_packet(CONNACK, 0, b'\x00\x00'))
+
+                elif packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic, offset = _string(body, 0)
+                    if qos:
+                        mid = body[offset:offset + 2]
+                        offset += 2
+                        self.send(_packet(PUBACK, 0, mid))
+                    payload = body[offset:]
+                    self.broker.route(topic, payload, qos)
+
+                elif packet_type == SUBSCRIBE:
+                    mid = body[:2]
+                    offset, granted = 2, bytearray()
+                    while offset < len(body):
+                        pattern, offset = _string(body, offset)
+                        requested = body[offset]
+                        offset += 1
+                        self.subscriptions.add(pattern)
+                        granted.append(min(requested, 1))
+                    self.send(_packet(SUBACK, 0, mid + bytes(granted)))
+
+                elif packet_type == UNSUBSCRIBE:
+                    mid = body[:2]
+                    offset = 2
+                    while offset < len(body):
+                        pattern, offset = _string(body, offset)
+                        self.subscriptions.discard(pattern)
+                    self.send(_packet(UNSUBACK, 0, mid))
+
+                elif packet_type == PINGREQ:
+                    self.send(_packet(PINGRESP, 0, b''))
+
+                elif packet_type == DISCONNECT:
+                    break
+
+                # PUBACK (訂閱者回覆) 不需處理
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.broker.sessions.discard(self)
+            self.writer.close()
+
+
+class MiniBroker:
+    """在背景執行緒執行的本機 MQTT broker"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.sessions = set()
+        self.stats = {'connects': 0, 'messages': 0, 'bytes': 0}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def route(self, topic, payload, qos):
+        self.stats['messages'] += 1
+        self.stats['bytes'] += len(payload)
+        for session in list(self.sessions):
+            for pattern in session.subscriptions:
+                if topic_matches(pattern, topic):
+                    session.deliver(topic, payload, qos)
+                    break
+
+    async def _handle(self, reader, writer):
+        session = _Session(self, reader, writer)
+        self.sessions.add(session)
+        await session.run()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""離線 MQTT 基準測試套件
+
+在本機啟動 MiniBroker (mini_broker.py)，不需要外部 broker 或網路，量測:
+    - 每個 publish_* 方法在 QoS 0 / QoS 1 下的消息數/秒、位元組/秒與每則消息 CPU 時間
+    - MQTTPublisher.connect() 的連線時間
+    - CoT 編碼器 (XML / protobuf) 的吞吐量
+    - 車隊模擬器對本機 broker 的實際發布速率
+
+結果與 JSON 基準比較 (基準檔不存在時以非零狀態結束)，任何吞吐量下降超過 --max-regression 百分比時以非零狀態結束；
+車隊模擬器的發布速率受目標速率限制，改以每則消息 CPU 時間 (越低越好) 比較。
+CPU 時間為整個程序 (含 paho 網路執行緒與 broker)，caller_cpu 只計算呼叫端執行緒。
+
+用法 (於 backend 目錄):
+    python benchmarks/run_benchmarks.py --update-baseline     # 建立 / 更新 baseline.json
+    python benchmarks/run_benchmarks.py                       # 與 baseline.json 比較
+    python benchmarks/run_benchmarks.py --count 2000 --max-regression 20 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bundle_codec import BundleRecord  # noqa: E402
+from cot_encoder import benchmark as cot_benchmark  # noqa: E402
+from fleet_simulator import FleetConfig, run_fleet  # noqa: E402
+from mini_broker import MiniBroker  # noqa: E402
+from mqtt_publish import MQTTPublisher, CAMERA_ACTIONS  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_MAX_REGRESSION = 15.0  # 百分比
+
+# 與基準比較的吞吐量指標
+THROUGHPUT_METRICS = ('messages_per_second', 'connects_per_second')
+# 沒有吞吐量指標的量測改比較成本 (越低越好)
+COST_METRICS = ('cpu_us_per_message',)
+# 工作量不同 (例如 --count 不同) 的量測不互相比較
+WORKLOAD_KEYS = ('messages', 'devices', 'connects', 'duration')
+
+MAX_IN_FLIGHT = 1000
+FLUSH_TIMEOUT = 30
+BUNDLE_DEVICES = 100
+BENCH_LAT, BENCH_LON = 24.993861, 121.2995
+
+_BUNDLE_RECORDS = [
+    BundleRecord(f"bench-{i:05d}", BENCH_LAT + i * 1e-5, BENCH_LON + i * 1e-5, 42.5, 80, 90)
+    for i in range(BUNDLE_DEVICES)
+]
+
+# (名稱, 每次量測的消息數比例, 發布函式)
+PUBLISH_CASES = [
+    ('publish_camera_command', 1,
+     lambda p, i: p.publish_camera_command(CAMERA_ACTIONS[i % len(CAMERA_ACTIONS)])),
+    ('publish_gps_update', 1,
+     lambda p, i: p.publish_gps_update(BENCH_LAT + i * 1e-7, BENCH_LON, 42.5, device_id="bench-1")),
+    ('publish_device_status', 1,
+     lambda p, i: p.publish_device_status("bench-1", "active", battery=80, signal=90)),
+    ('publish_cot_message_xml', 1,
+     lambda p, i: p.publish_cot_message("bench-1", BENCH_LAT + i * 1e-7, BENCH_LON, 42.5,
+                                        callsign="Bench-1", battery=80)),
+    ('publish_cot_message_proto', 1,
+     lambda p, i: p.publish_cot_message("bench-1", BENCH_LAT + i * 1e-7, BENCH_LON, 42.5,
+                                        callsign="Bench-1", battery=80, encoding="proto")),
+    # 每則 bundle 含 100 個設備，消息數取 1/10
+    ('publish_bundle', 0.1,
+     lambda p, i: p.publish_bundle(_BUNDLE_RECORDS)),
+]
+
+
+def _wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def _connect(port, qos=1):
+    publisher = MQTTPublisher('127.0.0.1', port, verbose=False, qos=qos,
+                              max_in_flight=MAX_IN_FLIGHT)
+    if not publisher.connect():
+        raise RuntimeError(f"cannot connect to local broker on port {port}")
+    return publisher
+
+
+# ==================== 量測 ====================
+
+def bench_publish(broker, publish, qos, count):
+    """以單一連線發布 count 則消息，直到 broker 全部收到為止"""
+    publisher = _connect(broker.port, qos)
+    messages_before = broker.stats['messages']
+    bytes_before = broker.stats['bytes']
+
+    cpu_start = time.process_time()
+    caller_start = time.thread_time()
+    start = time.perf_counter()
+
+    for i in range(count):
+        publish(publisher, i)
+    caller_cpu = time.thread_time() - caller_start
+
+    # QoS 1 等待 PUBACK；QoS 0 沒有確認，改以 broker 收到的消息數判斷完成
+    acked = publisher.pipeline.flush(FLUSH_TIMEOUT)
+    received = _wait_for(lambda: broker.stats['messages'] - messages_before >= count, FLUSH_TIMEOUT)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    publisher.disconnect()
+    if not (acked and received):
+        raise RuntimeError(f"only {broker.stats['messages'] - messages_before} of {count} "
+                           f"messages reached the broker")
+
+    payload_bytes = broker.stats['bytes'] - bytes_before
+    return {
+        'qos': qos,
+        'messages': count,
+        'payload_bytes': round(payload_bytes / count),
+        'elapsed': round(elapsed, 4),
+        'messages_per_second': round(count / elapsed, 1),
+        'bytes_per_second': round(payload_bytes / elapsed),
+        'cpu_us_per_message': round(cpu / count * 1e6, 2),
+        'caller_cpu_us_per_message': round(caller_cpu / count * 1e6, 2)
+    }
+
+
+def bench_connect(broker, count):
+    """量測 MQTTPublisher.connect() 到收到 CONNACK 的時間"""
+    samples = []
+    for _ in range(count):
+        publisher = MQTTPublisher('127.0.0.1', broker.port, verbose=False)
+        start = time.perf_counter()
+        if not publisher.connect():
+            raise RuntimeError(f"cannot connect to local broker on port {broker.port}")
+        samples.append(time.perf_counter() - start)
+        publisher.disconnect()
+
+    samples.sort()
+    mean = sum(samples) / len(samples)
+    return {
+        'connects': count,
+        'connect_ms_mean': round(mean * 1000, 3),
+        'connect_ms_max': round(samples[-1] * 1000, 3),
+        'connects_per_second': round(1 / mean, 1)
+    }
+
+
+def bench_simulator(broker, devices, duration):
+    """車隊模擬器對本機 broker 的實際發布速率 (目標速率 = devices * 3 / 0.5s)"""
+    config = FleetConfig(devices=devices, connections=4, workers=1, duration=duration,
+                         interval=0.5, seed=1, broker='127.0.0.1', port=broker.port,
+                         max_in_flight=MAX_IN_FLIGHT)
+    cpu_start = time.process_time()
+    report = run_fleet(config)
+    cpu = time.process_time() - cpu_start
+    # publish_rate 受目標速率限制，不作為吞吐量指標
+    return {
+        'devices': devices,
+        'duration': duration,
+        'sent': report['sent'],
+        'target_rate': report['target_rate'],
+        'achieved_rate': report['achieved_rate'],
+        'publish_rate': report['publish_rate'],
+        'max_schedule_lag': report['max_schedule_lag'],
+        'cpu_us_per_message': round(cpu / max(1, report['sent']) * 1e6, 2)
+    }
+
+
+def _best(runs):
+    """多次量測取吞吐量最高者，降低排程雜訊"""
+    return max(runs, key=lambda r: r['messages_per_second'])
+
+
+def run_suite(count=5000, repeat=3, connects=20, sim_devices=1000, sim_duration=3.0):
+    results = {}
+    with MiniBroker() as broker:
+        print(f"🧪 Local broker listening on 127.0.0.1:{broker.port}")
+
+        results['connect'] = bench_connect(broker, connects)
+
+        for name, scale, publish in PUBLISH_CASES:
+            messages = max(1, int(count * scale))
+            for qos in (0, 1):
+                key = f"{name}@qos{qos}"
+                print(f"   {key} ({messages} messages x {repeat})")
+                results[key] = _best([bench_publish(broker, publish, qos, messages)
+                                      for _ in range(repeat)])
+
+        for result in cot_benchmark(count * 10):
+            results[f"cot_builder_{result['encoding']}"] = {
+                'messages': count * 10,
+                'bytes': result['bytes'],
+                'us_per_message': result['us_per_message'],
+                'messages_per_second': result['messages_per_second']
+            }
+
+        results['fleet_simulator'] = bench_simulator(broker, sim_devices, sim_duration)
+
+    return {
+        'generated': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}",
+        'count': count,
+        'results': results
+    }
+
+
+# ==================== 基準比較 ====================
+
+def compare(report, baseline, max_regression):
+    """在 report 中標記相對基準的變化，返回超過門檻的退化清單"""
+    regressions = []
+    reference = baseline.get('results', {})
+    for key, result in report['results'].items():
+        previous = reference.get(key)
+        if not previous or any(previous.get(k) != result.get(k) for k in WORKLOAD_KEYS):
+            continue
+        for metric in THROUGHPUT_METRICS:
+            if metric not in result or not previous.get(metric):
+                continue
+            change = (result[metric] - previous[metric]) / previous[metric] * 100
+            result['change_percent'] = round(change, 1)
+            if change < -max_regression:
+                regressions.append((key, metric, previous[metric], result[metric], change))
+        if any(metric in result for metric in THROUGHPUT_METRICS):
+            continue
+        for metric in COST_METRICS:
+            if metric not in result or not previous.get(metric):
+                continue
+            change = (result[metric] - previous[metric]) / previous[metric] * 100
+            result['change_percent'] = round(change, 1)
+            if change > max_regression:
+                regressions.append((key, metric, previous[metric], result[metric], change))
+    return regressions
+
+
+def format_report(report):
+    lines = [f"{'case':<34} {'msg/s':>10} {'bytes/s':>12} {'cpu us/msg':>11} {'change':>8}"]
+    for key, result in report['results'].items():
+        rate = result.get('messages_per_second',
+                          result.get('connects_per_second', result.get('publish_rate', 0)))
+        change = result.get('change_percent')
+        lines.append(
+            f"{key:<34} {rate:>10.1f} {result.get('bytes_per_second', ''):>12} "
+            f"{result.get('cpu_us_per_message', ''):>11} "
+            f"{'' if change is None else f'{change:+.1f}%':>8}"
+        )
+    connect = report['results'].get('connect')
+    if connect:
+        lines.append(f"connect: mean {connect['connect_ms_mean']} ms, "
+                     f"max {connect['connect_ms_max']} ms")
+    return '\n'.join(lines)
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline MQTT publisher benchmark suite')
+    parser.add_argument('--count', type=int, default=5000,
+                        help='Messages per publish case (default: 5000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per publish case, best one is kept (default: 3)')
+    parser.add_argument('--connects', type=int, default=20,
+                        help='Connections for the connect-time case (default: 20)')
+    parser.add_argument('--sim-devices', type=int, default=1000,
+                        help='Devices for the simulator case (default: 1000)')
+    parser.add_argument('--sim-duration', type=float, default=3.0,
+                        help='Simulator case duration in seconds (default: 3)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON file (default: benchmarks/baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Write this run as the new baseline instead of comparing')
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help='Fail when throughput drops (or CPU cost rises) more than this percent (default: 15)')
+    parser.add_argument('--output', help='Also write this run to a JSON file')
+    args = parser.parse_args()
+
+    report = run_suite(args.count, args.repeat, args.connects, args.sim_devices,
+                       args.sim_duration)
+
+    regressions = []
+    missing_baseline = False
+    if args.update_baseline:
+        _write_json(args.baseline, report)
+        print(f"💾 Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if (baseline.get('python'), baseline.get('machine')) != (report['python'], report['machine']):
+            print(f"⚠️ Baseline was recorded on {baseline.get('machine')} / "
+                  f"Python {baseline.get('python')}")
+        regressions = compare(report, baseline, args.max_regression)
+    else:
+        # 沒有基準就無法把關，不能以成功結束
+        missing_baseline = True
+
+    print()
+    print(format_report(report))
+
+    if args.output:
+        _write_json(args.output, report)
+
+    if missing_baseline:
+        print(f"\n❌ No baseline at {args.baseline}; run with --update-baseline to create one")
+        sys.exit(2)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {args.max_regression}%:")
+        for key, metric, previous, current, change in regressions:
+            print(f"   {key} {metric}: {previous} -> {current} ({change:+.1f}%)")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
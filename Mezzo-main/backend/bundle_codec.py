@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""設備狀態 bundle：把一或多個設備的位置、電量、信號與狀態打包成單一二進位訊框
+
+訊框格式 (little-endian):
+    header  : magic "MB" (2s) | version (B) | flags (B) | count (H) | timestamp ms (Q)   = 14 bytes
+    record  : id length (B) | device id (utf-8) | lat (i, 1e-7 度) | lon (i, 1e-7 度)
+              | alt (h, 0.1 公尺) | battery (B) | signal (B) | status (B)               = 14 + id bytes
+
+battery / signal 為 255 表示未知；status 以 STATUS_CODES 編碼。
+server.cjs 的 decodeBundle() 為對應的 JavaScript 解碼器。
+
+用法 (大小與吞吐量比較):
+    python bundle_codec.py --devices 100
+"""
+import argparse
+import json
+import struct
+import time
+from collections import namedtuple
+
+BUNDLE_MAGIC = b'MB'
+BUNDLE_VERSION = 1
+
+_HEADER = struct.Struct('<2sBBHQ')
+_RECORD = struct.Struct('<iihBBB')
+
+COORD_SCALE = 10_000_000
+ALT_SCALE = 10
+UNKNOWN = 255
+MAX_DEVICES = 0xffff
+
+STATUS_CODES = {'active': 0, 'warning': 1, 'inactive': 2, 'offline': 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+STATUS_OTHER = 254
+
+BundleRecord = namedtuple(
+    'BundleRecord', 'device_id lat lon alt battery signal status',
+    defaults=(0, None, None, 'active')
+)
+
+
+def _byte(value):
+    return UNKNOWN if value is None else max(0, min(254, int(value)))
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def encode_bundle(records, timestamp=None):
+    """將 BundleRecord 序列編碼為二進位訊框"""
+    if timestamp is None:
+        timestamp = time.time()
+    if len(records) > MAX_DEVICES:
+        raise ValueError(f"bundle supports at most {MAX_DEVICES} devices, got {len(records)}")
+
+    parts = [_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(records), int(timestamp * 1000))]
+    pack = _RECORD.pack
+    for record in records:
+        device_id = record.device_id.encode('utf-8')
+        if len(device_id) > 255:
+            raise ValueError(f"device id too long for bundle: {record.device_id!r}")
+        parts.append(bytes((len(device_id),)))
+        parts.append(device_id)
+        parts.append(pack(
+            round(record.lat * COORD_SCALE),
+            round(record.lon * COORD_SCALE),
+            _clamp(round(record.alt * ALT_SCALE), -32768, 32767),
+            _byte(record.battery),
+            _byte(record.signal),
+            STATUS_CODES.get(record.status, STATUS_OTHER)
+        ))
+    return b''.join(parts)
+
+
+def decode_bundle(data):
+    """解碼二進位訊框，返回 (timestamp 秒, [BundleRecord, ...])"""
+    if len(data) < _HEADER.size:
+        raise ValueError("bundle too short")
+
+    magic, version, _, count, timestamp_ms = _HEADER.unpack_from(data, 0)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError("not a device bundle")
+    if version != BUNDLE_VERSION:
+        raise ValueError(f"unsupported bundle version {version}")
+
+    records = []
+    offset = _HEADER.size
+    unpack = _RECORD.unpack_from
+    for _ in range(count):
+        length = data[offset]
+        offset += 1
+        device_id = bytes(data[offset:offset + length]).decode('utf-8')
+        offset += length
+        lat, lon, alt, battery, signal, status = unpack(data, offset)
+        offset += _RECORD.size
+        records.append(BundleRecord(
+            device_id,
+            lat / COORD_SCALE,
+            lon / COORD_SCALE,
+            alt / ALT_SCALE,
+            None if battery == UNKNOWN else battery,
+            None if signal == UNKNOWN else signal,
+            STATUS_NAMES.get(status, 'unknown')
+        ))
+    return timestamp_ms / 1000, records
+
+
+# ==================== 大小與吞吐量比較 ====================
+
+def _json_messages(record, now):
+    """目前每個 tick 的三則消息 (GPS JSON、狀態 JSON、CoT XML)"""
+    from cot_encoder import get_encoder
+
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(now))
+    gps = json.dumps({
+        "deviceId": record.device_id, "latitude": record.lat, "longitude": record.lon,
+        "altitude": record.alt, "accuracy": 10.0, "timestamp": timestamp
+    })
+    status = json.dumps({
+        "deviceId": record.device_id, "status": record.status, "timestamp": timestamp,
+        "battery": record.battery, "signal": record.signal
+    })
+    cot = get_encoder().encode_xml(
+        record.device_id, record.lat, record.lon, record.alt,
+        f"Device-{record.device_id}", "", record.battery, now
+    )
+    return [gps.encode('utf-8'), status.encode('utf-8'), cot.encode('utf-8')]
+
+
+def benchmark(devices=100, rounds=200):
+    """比較 JSON/XML 三則消息與單一 bundle 的位元組數、消息數與編解碼速度"""
+    now = time.time()
+    records = [
+        BundleRecord(f"sim-{i:05d}", 24.99 + i * 1e-4, 121.29 + i * 1e-4, 42.5, 80, 90, 'active')
+        for i in range(devices)
+    ]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy = [m for record in records for m in _json_messages(record, now)]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        bundle = encode_bundle(records, now)
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode_bundle(bundle)
+    decode_time = time.perf_counter() - start
+
+    return {
+        'devices': devices,
+        'legacy_messages': len(legacy),
+        'legacy_bytes': sum(len(m) for m in legacy),
+        'bundle_messages': 1,
+        'bundle_bytes': len(bundle),
+        'legacy_encode_devices_per_second': round(devices * rounds / legacy_time),
+        'bundle_encode_devices_per_second': round(devices * rounds / encode_time),
+        'bundle_decode_devices_per_second': round(devices * rounds / decode_time)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Device bundle size/throughput comparison')
+    parser.add_argument('--devices', type=int, default=100,
+                        help='Devices per bundle (default: 100)')
+    parser.add_argument('--rounds', type=int, default=200,
+                        help='Encode/decode rounds (default: 200)')
+    args = parser.parse_args()
+
+    result = benchmark(args.devices, args.rounds)
+    print(f"📦 {result['devices']} devices per tick")
+    print(f"   JSON/XML: {result['legacy_messages']} messages, {result['legacy_bytes']} bytes, "
+          f"{result['legacy_encode_devices_per_second']} devices/s encode")
+    print(f"   Bundle:   {result['bundle_messages']} message,  {result['bundle_bytes']} bytes, "
+          f"{result['bundle_encode_devices_per_second']} devices/s encode, "
+          f"{result['bundle_decode_devices_per_second']} devices/s decode")
+    print(f"   Size ratio: {result['legacy_bytes'] / result['bundle_bytes']:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""CoT (Cursor on Target) 編碼器
+
+每種事件類型預先編譯 XML 樣板與 protobuf 靜態欄位，時間戳以秒為單位快取，
+並提供 TAK Protocol v1 (takproto) 二進位編碼。
+
+用法 (微基準測試):
+    python cot_encoder.py --count 50000
+"""
+import argparse
+import struct
+import time
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+STALE_SECONDS = 300
+
+# TAK Protocol v1 header: 0xbf 0x01 0xbf (mesh) / 0xbf <varint length> (stream)
+TAK_MAGIC = 0xbf
+TAK_PROTOCOL_VERSION = 1
+TAK_MESH_HEADER = bytes([TAK_MAGIC, TAK_PROTOCOL_VERSION, TAK_MAGIC])
+
+# 以 "\0" 分隔的樣板，依序填入 uid, time, time, stale, lat, lon, alt, callsign, remarks, status
+_XML_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<event version="2.0" uid="\0" type="%(type)s" how="%(how)s"
+       time="\0" start="\0" stale="\0">
+  <point lat="\0" lon="\0" hae="\0" ce="%(ce)s" le="%(le)s"/>
+  <detail>
+    <contact callsign="\0"/>
+    <remarks>\0</remarks>\0
+    <precisionlocation geopointsrc="GPS" altsrc="GPS"/>
+  </detail>
+</event>'''
+
+_STATUS_TEMPLATE = '\n    <status battery="%d" />'
+
+
+# ==================== 時間格式 ====================
+
+@lru_cache(maxsize=8)
+def _second_prefix(second):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+
+
+def format_cot_time(timestamp):
+    """將 epoch 秒轉為 CoT 時間字串 (UTC, 毫秒精度)，同一秒內重用已格式化的前綴"""
+    second, millis = divmod(int(timestamp * 1000 + 0.5), 1000)
+    return "%s.%03dZ" % (_second_prefix(second), millis)
+
+
+@lru_cache(maxsize=4096)
+def _escape_attr(value):
+    return escape(str(value), {'"': '&quot;'})
+
+
+@lru_cache(maxsize=4096)
+def _escape_text(value):
+    return escape(str(value))
+
+
+# ==================== protobuf 基本編碼 ====================
+
+_SMALL_VARINTS = [bytes((i,)) for i in range(0x80)]
+
+
+def _varint(value):
+    if value < 0x80:
+        return _SMALL_VARINTS[value]
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+@lru_cache(maxsize=None)
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, data):
+    return b''.join((_key(field, 2), _varint(len(data)), data))
+
+
+def _string_field(field, value):
+    return _bytes_field(field, value.encode('utf-8'))
+
+
+def _uint_field(field, value):
+    return _key(field, 0) + _varint(value)
+
+
+def _double_field(field, value):
+    return _key(field, 1) + struct.pack('<d', value)
+
+
+# CotEvent.lat (10), lon (11), hae (12) 的 key 皆為單一位元組，一次打包
+_POSITION = struct.Struct('<BdBdBd')
+_POSITION_KEYS = (_key(10, 1)[0], _key(11, 1)[0], _key(12, 1)[0])
+# CotEvent.sendTime (6), startTime (7), staleTime (8)
+_SEND_TIME_KEY = _key(6, 0)
+_START_TIME_KEY = _key(7, 0)
+_STALE_TIME_KEY = _key(8, 0)
+
+
+@lru_cache(maxsize=4096)
+def _contact_field(callsign):
+    # Detail.contact (2) -> Contact.callsign (2)
+    return _bytes_field(2, _string_field(2, callsign))
+
+
+# Detail.precisionLocation (4) -> geopointsrc (1), altsrc (2)
+_PRECISION_LOCATION = _bytes_field(4, _string_field(1, "GPS") + _string_field(2, "GPS"))
+
+
+def frame_mesh(payload):
+    """TAK Protocol v1 mesh 格式 (UDP / MQTT 等自帶邊界的傳輸)"""
+    return TAK_MESH_HEADER + payload
+
+
+def frame_stream(payload):
+    """TAK Protocol v1 stream 格式 (TCP 串流)"""
+    return bytes([TAK_MAGIC]) + _varint(len(payload)) + payload
+
+
+# ==================== 編碼器 ====================
+
+class CotEncoder:
+    """特定事件類型的 CoT 編碼器，靜態部分在建構時預先編譯"""
+
+    def __init__(self, cot_type="a-f-G-U-C", how="h-e", ce=9999999.0, le=9999999.0,
+                 stale_seconds=STALE_SECONDS):
+        self.cot_type = cot_type
+        self.how = how
+        self.stale_seconds = stale_seconds
+
+        self._xml_parts = (_XML_TEMPLATE % {
+            'type': _escape_attr(cot_type),
+            'how': _escape_attr(how),
+            'ce': ce,
+            'le': le
+        }).split('\0')
+
+        # CotEvent.type (1), how (9), ce (13), le (14)
+        self._proto_static = (
+            _string_field(1, cot_type) +
+            _string_field(9, how) +
+            _double_field(13, ce) +
+            _double_field(14, le)
+        )
+
+    def encode_xml(self, uid, lat, lon, alt=0, callsign="Unknown", remarks="",
+                   battery=None, now=None):
+        """編碼為 CoT XML 字串"""
+        if now is None:
+            now = time.time()
+        timestamp = format_cot_time(now)
+        parts = self._xml_parts
+
+        return ''.join((
+            parts[0], _escape_attr(uid),
+            parts[1], timestamp,
+            parts[2], timestamp,
+            parts[3], format_cot_time(now + self.stale_seconds),
+            parts[4], str(lat),
+            parts[5], str(lon),
+            parts[6], str(alt),
+            parts[7], _escape_attr(callsign),
+            parts[8], _escape_text(remarks) if remarks else "",
+            parts[9], _STATUS_TEMPLATE % battery if battery is not None else "",
+            parts[10]
+        ))
+
+    def encode_proto(self, uid, lat, lon, alt=0, callsign="Unknown", remarks="",
+                     battery=None, now=None):
+        """編碼為 TAK Protocol v1 TakMessage (不含 header)"""
+        if now is None:
+            now = time.time()
+        millis = int(now * 1000)
+        millis_varint = _varint(millis)
+
+        detail = _contact_field(callsign) + _PRECISION_LOCATION
+        if remarks:
+            # Detail.xmlDetail (1)
+            detail = _string_field(1, f"<remarks>{_escape_text(remarks)}</remarks>") + detail
+        if battery is not None:
+            # Detail.status (5) -> Status.battery (1)
+            detail += _bytes_field(5, _uint_field(1, int(battery)))
+
+        event = b''.join((
+            self._proto_static,
+            _string_field(5, uid),
+            _SEND_TIME_KEY, millis_varint,
+            _START_TIME_KEY, millis_varint,
+            _STALE_TIME_KEY, _varint(millis + self.stale_seconds * 1000),
+            _POSITION.pack(_POSITION_KEYS[0], lat, _POSITION_KEYS[1], lon, _POSITION_KEYS[2], alt),
+            _bytes_field(15, detail)
+        ))
+        # TakMessage.cotEvent (2)
+        return _bytes_field(2, event)
+
+
+@lru_cache(maxsize=64)
+def get_encoder(cot_type="a-f-G-U-C", how="h-e"):
+    """取得 (並快取) 指定事件類型的編碼器"""
+    return CotEncoder(cot_type, how)
+
+
+# ==================== 解碼 (參考實作) ====================
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(data):
+    """逐一產出 (field, wire_type, value)"""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value = struct.unpack_from('<d', data, pos)[0]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            value = bytes(data[pos:pos + length])
+            pos += length
+        elif wire_type == 5:
+            value = bytes(data[pos:pos + 4])
+            pos += 4
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+        yield field, wire_type, value
+
+
+_EVENT_FIELDS = {
+    1: 'type', 5: 'uid', 6: 'sendTime', 7: 'startTime', 8: 'staleTime', 9: 'how',
+    10: 'lat', 11: 'lon', 12: 'hae', 13: 'ce', 14: 'le'
+}
+
+
+def decode_proto(payload):
+    """解碼 TakMessage (可含 mesh header)，返回 CotEvent 主要欄位的 dict"""
+    if payload[:3] == TAK_MESH_HEADER:
+        payload = payload[3:]
+
+    event = {}
+    for field, _, value in _fields(payload):
+        if field != 2:
+            continue
+        for event_field, _, event_value in _fields(value):
+            name = _EVENT_FIELDS.get(event_field)
+            if name:
+                event[name] = event_value.decode('utf-8') if isinstance(event_value, bytes) else event_value
+            elif event_field == 15:
+                for detail_field, _, detail_value in _fields(event_value):
+                    if detail_field == 1:
+                        event['xmlDetail'] = detail_value.decode('utf-8')
+                    elif detail_field == 2:
+                        for f, _, v in _fields(detail_value):
+                            if f == 2:
+                                event['callsign'] = v.decode('utf-8')
+                    elif detail_field == 5:
+                        for f, _, v in _fields(detail_value):
+                            if f == 1:
+                                event['battery'] = v
+    return event
+
+
+# ==================== 微基準測試 ====================
+
+def _legacy_xml(uid, lat, lon, alt, callsign, remarks):
+    """原本 publish_cot_message 的 f-string 寫法，作為基準"""
+    from datetime import datetime, timezone
+
+    now = datetime.now(timezone.utc)
+    stale = datetime.fromtimestamp(now.timestamp() + 300, timezone.utc)
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<event version="2.0" uid="{uid}" type="a-f-G-U-C" how="h-e"
+       time="{now.isoformat()}" start="{now.isoformat()}" stale="{stale.isoformat()}">
+  <point lat="{lat}" lon="{lon}" hae="{alt}" ce="9999999.0" le="9999999.0"/>
+  <detail>
+    <contact callsign="{callsign}"/>
+    <remarks>{remarks}</remarks>
+    <status battery="85" />
+    <precisionlocation geopointsrc="GPS" altsrc="GPS"/>
+  </detail>
+</event>'''
+
+
+def benchmark(count=50000):
+    """比較舊版 f-string、XML 樣板與 protobuf 的編碼時間與大小"""
+    encoder = get_encoder()
+    args = ("sim-00001", 24.9938612345, 121.2995123456, 42.5, "Device-sim-00001",
+            "Simulated device")
+
+    cases = [
+        ('legacy-xml', lambda: _legacy_xml(*args).encode('utf-8')),
+        ('xml', lambda: encoder.encode_xml(*args, battery=85).encode('utf-8')),
+        ('proto', lambda: frame_mesh(encoder.encode_proto(*args, battery=85))),
+    ]
+
+    results = []
+    for name, encode in cases:
+        size = len(encode())
+        start = time.perf_counter()
+        for _ in range(count):
+            encode()
+        elapsed = time.perf_counter() - start
+        results.append({
+            'encoding': name,
+            'bytes': size,
+            'us_per_message': round(elapsed / count * 1e6, 3),
+            'messages_per_second': round(count / elapsed)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CoT encoder micro-benchmark')
+    parser.add_argument('--count', type=int, default=50000,
+                        help='Messages to encode per case (default: 50000)')
+    args = parser.parse_args()
+
+    print(f"⏱️  Encoding {args.count} CoT events per case")
+    print(f"{'encoding':<12} {'bytes':>6} {'us/msg':>8} {'msg/s':>10}")
+    for result in benchmark(args.count):
+        print(f"{result['encoding']:<12} {result['bytes']:>6} "
+              f"{result['us_per_message']:>8.2f} {result['messages_per_second']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""車隊模擬器：單一程序以 asyncio 排程大量虛擬設備，共用少量 MQTT 連線
+
+用法:
+    python mqtt_publish.py simulate-fleet --devices 2000 --connections 8 --workers 4
+"""
+import asyncio
+import logging
+import multiprocessing
+import random
+import time
+from dataclasses import dataclass, replace
+
+from bundle_codec import BundleRecord, MAX_DEVICES
+from mqtt_publish import MQTTPublisher, MQTT_BROKER, MQTT_PORT
+from publish_pipeline import BACKPRESSURE_DROP
+from reporting_policy import ReportingPolicy
+
+logger = logging.getLogger('mqtt_publish')
+
+# 每個 tick 發布的消息數 (GPS + 狀態 + CoT)
+MESSAGES_PER_TICK = 3
+# 初始位置散布半徑 (度)
+SPAWN_RADIUS = 0.01
+# 每個 tick 的位移幅度 (度)：移動中約 ±11 公尺，靜止設備只有約 ±0.5 公尺的 GPS 雜訊
+MOVING_STEP = 0.0001
+STATIONARY_STEP = 0.000005
+
+
+@dataclass
+class FleetConfig:
+    devices: int = 100
+    connections: int = 4
+    workers: int = 1
+    lat: float = 24.993861
+    lon: float = 121.2995
+    duration: float = 60
+    interval: float = 5
+    jitter: float = 0.2
+    seed: int = None
+    broker: str = MQTT_BROKER
+    port: int = MQTT_PORT
+    topic_prefix: str = ""
+    first_device: int = 0
+    stationary: float = 0.0
+    deadband: bool = False
+    min_distance: float = 10.0
+    max_silence: float = 60.0
+    bundle: bool = False
+    bundle_window: float = 1.0
+    max_in_flight: int = 100
+
+
+class VirtualDevice:
+    """單一虛擬設備：獨立的隨機遊走、電量衰減與抖動間隔"""
+
+    __slots__ = ('device_id', 'rng', 'lat', 'lon', 'alt', 'battery', 'drain',
+                 'interval', 'jitter', 'count', 'step_size')
+
+    def __init__(self, device_id, lat, lon, interval, jitter, seed=None, stationary=False):
+        self.device_id = device_id
+        self.rng = random.Random(seed)
+        self.lat = lat + self.rng.uniform(-SPAWN_RADIUS, SPAWN_RADIUS)
+        self.lon = lon + self.rng.uniform(-SPAWN_RADIUS, SPAWN_RADIUS)
+        self.alt = self.rng.uniform(0, 100)
+        self.battery = self.rng.uniform(60, 100)
+        self.drain = self.rng.uniform(0.05, 0.5)  # 每個 tick 的電量衰減 (%)
+        self.interval = interval
+        self.jitter = jitter
+        self.count = 0
+        self.step_size = STATIONARY_STEP if stationary else MOVING_STEP
+
+    def next_delay(self):
+        """下一次回報前的等待時間 (含抖動)"""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + self.rng.uniform(-spread, spread))
+
+    def step(self):
+        """推進一個 tick"""
+        self.lat += self.rng.uniform(-self.step_size, self.step_size)
+        self.lon += self.rng.uniform(-self.step_size, self.step_size)
+        if self.step_size == MOVING_STEP:
+            self.alt = min(100.0, max(0.0, self.alt + self.rng.uniform(-2, 2)))
+        self.battery = max(0.0, self.battery - self.drain)
+        self.count += 1
+
+    def record(self):
+        """目前狀態的 bundle 記錄"""
+        battery = int(self.battery)
+        status = "active" if battery > 20 else "warning"
+        # 信號以 10 為單位量化，避免每個 tick 都視為狀態變化
+        signal = self.rng.randint(6, 10) * 10
+        return BundleRecord(self.device_id, self.lat, self.lon, self.alt, battery, signal, status)
+
+    def publish(self, publisher):
+        """發布一個 tick 的位置與狀態，返回實際發布的消息數"""
+        record = self.record()
+
+        sent = publisher.report_position(
+            self.device_id, self.lat, self.lon, self.alt,
+            callsign=f"Device-{self.device_id}",
+            remarks=f"Simulated device at iteration {self.count}",
+            battery=record.battery
+        )
+        sent += publisher.report_status(self.device_id, record.status, record.battery, record.signal)
+        return sent
+
+
+class BundleBatcher:
+    """把同一連線上各設備的 tick 合併，每個時間視窗發布一次 bundle"""
+
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self.records = {}  # device_id -> 最新記錄
+        self.suppressed = 0  # 被 dead-band 略過的記錄數 (不是消息數)
+
+    def add(self, record):
+        if self.publisher.include_in_bundle(record):
+            self.records[record.device_id] = record
+        else:
+            self.suppressed += 1
+
+    def flush(self):
+        """發布累積的記錄，返回發布的消息數"""
+        records = list(self.records.values())
+        self.records = {}
+        for start in range(0, len(records), MAX_DEVICES):
+            self.publisher.publish_bundle(records[start:start + MAX_DEVICES])
+        return -(-len(records) // MAX_DEVICES)
+
+
+async def _drive_device(device, publisher, batcher, deadline, stats):
+    loop = asyncio.get_running_loop()
+    # 隨機錯開第一次回報，避免所有設備同時發布
+    due = loop.time() + device.rng.uniform(0, device.interval)
+
+    while due < deadline:
+        await asyncio.sleep(max(0.0, due - loop.time()))
+
+        # 記錄排程延遲：事件迴圈跟不上時會變大
+        stats['max_lag'] = max(stats['max_lag'], loop.time() - due)
+        device.step()
+        if batcher:
+            batcher.add(device.record())
+        else:
+            stats['sent'] += device.publish(publisher)
+        stats['ticks'] += 1
+
+        # 以預定時間為基準排程，避免延遲累積造成漂移
+        due += device.next_delay()
+
+
+async def _run_devices(config, publishers):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.duration
+    stats = {'sent': 0, 'ticks': 0, 'max_lag': 0.0}
+    stationary = int(config.devices * config.stationary)
+    batchers = [BundleBatcher(p) for p in publishers] if config.bundle else None
+
+    tasks = []
+    for i in range(config.devices):
+        index = config.first_device + i
+        seed = None if config.seed is None else config.seed + index
+        device = VirtualDevice(
+            f"sim-{index:05d}", config.lat, config.lon,
+            config.interval, config.jitter, seed,
+            stationary=i < stationary
+        )
+        publisher = publishers[i % len(publishers)]
+        batcher = batchers[i % len(batchers)] if batchers else None
+        tasks.append(asyncio.create_task(
+            _drive_device(device, publisher, batcher, deadline, stats)
+        ))
+
+    if batchers:
+        tasks.append(asyncio.create_task(
+            _flush_bundles(batchers, config.bundle_window, deadline, stats)
+        ))
+
+    await asyncio.gather(*tasks)
+    if batchers:
+        stats['suppressed_records'] = sum(b.suppressed for b in batchers)
+    return stats
+
+
+async def _flush_bundles(batchers, window, deadline, stats):
+    loop = asyncio.get_running_loop()
+    while True:
+        remaining = deadline - loop.time()
+        await asyncio.sleep(max(0.0, min(window, remaining)))
+        for batcher in batchers:
+            stats['sent'] += batcher.flush()
+        if remaining <= window:
+            return
+
+
+def _run_shard(config, metrics=None):
+    """在單一程序中執行一部分設備，返回統計資料；metrics 由該程序的所有連線共用"""
+    publishers = []
+    for _ in range(max(1, min(config.connections, config.devices))):
+        policy = None
+        if config.deadband:
+            policy = ReportingPolicy(min_distance=config.min_distance,
+                                     max_silence=config.max_silence)
+        # 發布在事件迴圈內進行，視窗滿時不可阻塞 (會凍結所有設備)，一律丟棄並計入 dropped
+        publisher = MQTTPublisher(config.broker, config.port, verbose=False,
+                                  topic_prefix=config.topic_prefix, policy=policy,
+                                  max_in_flight=config.max_in_flight,
+                                  backpressure=BACKPRESSURE_DROP, metrics=metrics)
+        if publisher.connect():
+            publishers.append(publisher)
+            continue
+        # connect() 已啟動網路迴圈，不停止的話會在背景持續重連，連上後也沒有人使用或關閉
+        publisher.disconnect()
+        if metrics is not None:
+            metrics.detach(publisher.pipeline)
+
+    if not publishers:
+        logger.error(f"❌ Shard {config.first_device}: no MQTT connection available")
+        return {'sent': 0, 'ticks': 0, 'acked': 0, 'dropped': 0, 'max_lag': 0.0,
+                'elapsed': 0.0, 'connections': 0, 'suppressed': 0, 'suppressed_records': 0}
+
+    start = time.monotonic()
+    try:
+        stats = asyncio.run(_run_devices(config, publishers))
+    finally:
+        elapsed = time.monotonic() - start
+        # disconnect() 會先等待在途消息確認
+        for publisher in publishers:
+            publisher.disconnect()
+
+    stats['acked'] = sum(p.published_count for p in publishers)
+    stats['dropped'] = sum(p.pipeline.counters['dropped'] for p in publishers)
+    if config.bundle:
+        # bundle 模式發布的是 bundle，略過的是設備記錄，兩者單位不同不能相加
+        stats['suppressed'] = 0
+    else:
+        stats['suppressed'] = sum(
+            p.policy.counters['position_suppressed'] * 2 + p.policy.counters['status_suppressed']
+            for p in publishers if p.policy
+        )
+        stats['suppressed_records'] = 0
+    stats['elapsed'] = elapsed
+    stats['connections'] = len(publishers)
+    return stats
+
+
+def _split(config):
+    """把設備平均分配給各 worker"""
+    workers = max(1, min(config.workers, config.devices))
+    base, extra = divmod(config.devices, workers)
+    shards = []
+    first = 0
+    for w in range(workers):
+        count = base + (1 if w < extra else 0)
+        shards.append(replace(config, devices=count, first_device=first, workers=1))
+        first += count
+    return shards
+
+
+def run_fleet(config, metrics=None):
+    """執行車隊模擬並輸出實際發布速率與目標速率的比較
+
+    metrics (PublisherMetrics) 只在單一 worker 時收集；多個 worker 在各自的程序中發布。
+    """
+    # bundle 模式每個 tick 是 bundle 中的一筆設備記錄，而不是 3 則消息
+    per_tick, unit = (1, 'records/s') if config.bundle else (MESSAGES_PER_TICK, 'msg/s')
+    sent_unit = 'bundles' if config.bundle else 'messages'
+    target_rate = config.devices * per_tick / config.interval
+
+    logger.info(f"🔄 Starting fleet simulation: {config.devices} devices")
+    logger.info(f"   Workers: {config.workers}, Connections/worker: {config.connections}")
+    if config.stationary:
+        logger.info(f"   Stationary: {config.stationary * 100:.0f}% of devices")
+    if config.deadband:
+        logger.info(f"   Dead-band: {config.min_distance} m, heartbeat {config.max_silence}s")
+    if config.bundle:
+        logger.info(f"   Bundles: one per connection every {config.bundle_window}s")
+    logger.info(f"   Duration: {config.duration}s, Interval: {config.interval}s "
+                f"(±{config.jitter * 100:.0f}%)")
+    logger.info(f"   Target rate: {target_rate:.1f} {unit}")
+
+    shards = _split(config)
+    if len(shards) == 1:
+        results = [_run_shard(shards[0], metrics)]
+    else:
+        with multiprocessing.Pool(len(shards)) as pool:
+            results = pool.map(_run_shard, shards)
+
+    sent = sum(r['sent'] for r in results)
+    ticks = sum(r['ticks'] for r in results)
+    suppressed = sum(r['suppressed'] for r in results)
+    suppressed_records = sum(r['suppressed_records'] for r in results)
+    acked = sum(r['acked'] for r in results)
+    dropped = sum(r['dropped'] for r in results)
+    elapsed = max(r['elapsed'] for r in results) or 1e-9
+    max_lag = max(r['max_lag'] for r in results)
+    connections = sum(r['connections'] for r in results)
+    # 以排程的 tick 計算 (含被 dead-band 略過的消息)，反映模擬器本身是否跟得上
+    achieved = ticks * per_tick / elapsed
+
+    report = {
+        'devices': config.devices,
+        'workers': len(shards),
+        'connections': connections,
+        'elapsed': round(elapsed, 2),
+        'sent': sent,
+        'acked': acked,
+        'dropped': dropped,
+        'suppressed': suppressed,
+        'records': ticks,
+        'suppressed_records': suppressed_records,
+        'target_rate': round(target_rate, 1),
+        'achieved_rate': round(achieved, 1),
+        'rate_unit': unit,
+        'publish_rate': round(sent / elapsed, 1),
+        'ack_rate': round(acked / elapsed, 1),
+        'max_schedule_lag': round(max_lag, 3)
+    }
+
+    logger.info(f"✅ Fleet simulation completed in {elapsed:.1f}s")
+    logger.info(f"   Sent: {sent} {sent_unit} ({acked} acked, {dropped} dropped) "
+                f"over {connections} connections")
+    logger.info(f"   Achieved: {achieved:.1f} {unit} of {target_rate:.1f} target "
+                f"({achieved / target_rate * 100:.0f}%)")
+    logger.info(f"   Published: {report['publish_rate']} {sent_unit}/s, ack rate {report['ack_rate']} {sent_unit}/s")
+    if config.deadband and config.bundle:
+        logger.info(f"   Dead-band suppressed {suppressed_records} of {ticks} device records "
+                    f"({suppressed_records / max(1, ticks) * 100:.0f}%)")
+    elif config.deadband:
+        logger.info(f"   Dead-band suppressed {suppressed} of {sent + suppressed} messages "
+                    f"({suppressed / max(1, sent + suppressed) * 100:.0f}%)")
+    logger.info(f"   Max scheduling lag: {max_lag * 1000:.0f} ms")
+    return report
@@ -0,0 +1,751 @@
+#!/usr/bin/env python3
+"""HLS 錄影索引：保存串流分段並以牆鐘時間索引，產生任意時間區間的 VOD 播放清單
+
+StreamManager 的 ffmpeg 以 delete_segments 維持 5 個分段的直播清單。本服務監看 streams/，
+在分段寫完 (出現在直播清單中) 後以 hard link 保存到 recordings/，ffmpeg 刪除原檔後
+資料仍保留，直到超過保存期限或容量上限。保存時以記憶體映射讀取 TS 封包的 PAT/PMT、
+PES PTS (無 PTS 時用 PCR) 與關鍵幀旗標，不解碼影像。
+
+目錄結構:
+    recordings/<camera>/<YYYYMMDD>/<camera>_<start ms>.ts
+    recordings/<camera>/<YYYYMMDD>/segments.idx
+    recordings/<camera>/<YYYYMMDD>/points.idx
+
+索引格式 (little-endian、固定長度、依時間遞增附加):
+    segments.idx : start ms (Q) | end PTS (Q) | duration ms (I) | size (I)
+                   | first point (I) | point count (I) | flags (I)
+    points.idx   : time ms (Q) | byte offset (I)        每個關鍵幀 (含其前的 PAT/PMT) 一筆
+
+用法:
+    python hls_indexer.py watch --retention-hours 72 --max-gb 50 --http-port 4010
+    python hls_indexer.py scan                  # 保存並索引 streams/ 中現有的分段
+    python hls_indexer.py playlist --camera CAM-LOCAL-001 \\
+        --start 2026-01-08T15:12:40Z --end 1767885170000 --byterange
+
+HTTP (watch --http-port):
+    GET /cameras                                        各攝影機的錄影時間範圍 (JSON)
+    GET /vod/<camera>.m3u8?start=<ms>&end=<ms>&byterange=1
+    GET /recordings/<camera>/<day>/<file>.ts            支援 Range 請求
+"""
+import argparse
+import bisect
+import glob
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from cot_encoder import format_cot_time
+
+TS_PACKET = 188
+TS_SYNC = 0x47
+PAT_PID = 0
+
+PTS_CLOCK = 90          # PTS ticks per ms
+PTS_WRAP = 1 << 33
+VIDEO_STREAM_TYPES = {0x01, 0x02, 0x10, 0x1b, 0x24}
+
+# 前一分段結束到本分段開始超過此間隔、或與檔案時間推算的起點相差超過
+# RESYNC_MS 時，視為串流重啟並以檔案時間重新對齊
+MAX_GAP_MS = 10_000
+RESYNC_MS = 60_000
+
+FLAG_DISCONTINUITY = 1
+
+_SEGMENT = struct.Struct('<QQIIIII')
+_POINT = struct.Struct('<QI')
+
+SEGMENT_INDEX = 'segments.idx'
+POINT_INDEX = 'points.idx'
+STATE_FILE = 'state.json'
+DAY_FORMAT = '%Y%m%d'
+DAY_MS = 86_400_000
+
+DEFAULT_STREAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streams')
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')
+DEFAULT_HTTP_PORT = 4010
+
+# ffmpeg -hls_segment_filename {streamId}_%03d.ts
+_SOURCE_SEGMENT = re.compile(r'^(?P<camera>.+)_(?P<number>\d+)\.ts$')
+_ARCHIVED_SEGMENT = re.compile(r'_(?P<start>\d+)\.ts$')
+
+SegmentScan = namedtuple('SegmentScan', 'first_pts end_pts duration_ms size points')
+SegmentRecord = namedtuple(
+    'SegmentRecord', 'start_ms end_pts duration_ms size first_point point_count flags'
+)
+
+
+# ==================== TS 解析 ====================
+
+def _read_pts(data, offset):
+    return (((data[offset] >> 1) & 0x07) << 30 | data[offset + 1] << 22 |
+            (data[offset + 2] >> 1) << 15 | data[offset + 3] << 7 | data[offset + 4] >> 1)
+
+
+def _section(data, offset, pusi):
+    """跳過 pointer field，返回 (section 起點, section 結尾)"""
+    if pusi:
+        offset += 1 + data[offset]
+    length = ((data[offset + 1] & 0x0f) << 8) | data[offset + 2]
+    return offset, offset + 3 + length - 4  # 不含 CRC32
+
+
+def scan_segment(path):
+    """以記憶體映射掃描一個 TS 分段，返回 SegmentScan (PTS 皆為 90 kHz)
+
+    points 為 [(相對 first_pts 的 ms, byte offset), ...]，offset 指向關鍵幀前最近的 PAT，
+    使每個 byte range 都能獨立解碼。
+    """
+    size = os.path.getsize(path)
+    if size < TS_PACKET:
+        raise ValueError(f"segment too short: {path}")
+
+    pmt_pid = None
+    video_pid = None
+    pes_pids = []
+    pts_by_pid = {}
+    pcrs = []
+    keyframes = []      # (pts, offset)
+    last_pat = None
+    last_keyframe = -1
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = size - size % TS_PACKET
+        for offset in range(0, end, TS_PACKET):
+            if mm[offset] != TS_SYNC:
+                raise ValueError(f"lost TS sync at byte {offset} in {path}")
+            pid = ((mm[offset + 1] & 0x1f) << 8) | mm[offset + 2]
+            pusi = mm[offset + 1] & 0x40
+            control = (mm[offset + 3] >> 4) & 0x03
+            payload = offset + 4
+            random_access = False
+
+            if control & 0x02:
+                length = mm[payload]
+                if length:
+                    flags = mm[payload + 1]
+                    random_access = bool(flags & 0x40)
+                    if flags & 0x10:
+                        pcrs.append(_read_pcr_base(mm, payload + 2))
+                payload += 1 + length
+            if not control & 0x01 or payload >= offset + TS_PACKET:
+                continue
+
+            if pid == PAT_PID:
+                last_pat = offset
+                if pmt_pid is None and pusi:
+                    start, stop = _section(mm, payload, pusi)
+                    for entry in range(start + 8, stop, 4):
+                        if (mm[entry] << 8) | mm[entry + 1]:
+                            pmt_pid = ((mm[entry + 2] & 0x1f) << 8) | mm[entry + 3]
+                            break
+                continue
+
+            if pid == pmt_pid:
+                if not pes_pids and pusi:
+                    start, stop = _section(mm, payload, pusi)
+                    entry = start + 12 + (((mm[start + 10] & 0x0f) << 8) | mm[start + 11])
+                    while entry + 5 <= stop:
+                        stream_type = mm[entry]
+                        es_pid = ((mm[entry + 1] & 0x1f) << 8) | mm[entry + 2]
+                        pes_pids.append(es_pid)
+                        if video_pid is None and stream_type in VIDEO_STREAM_TYPES:
+                            video_pid = es_pid
+                        entry += 5 + (((mm[entry + 3] & 0x0f) << 8) | mm[entry + 4])
+                continue
+
+            if not pusi or mm[payload:payload + 3] != b'\x00\x00\x01':
+                continue
+            if mm[payload + 7] & 0x80:
+                pts = _read_pts(mm, payload + 9)
+                pts_by_pid.setdefault(pid, []).append(pts)
+                if pid == video_pid and random_access:
+                    # 關鍵幀：從其前的 PAT/PMT 開始切 (前一個關鍵幀之後的 PAT 才算)
+                    start = last_pat if last_pat is not None and last_pat > last_keyframe else offset
+                    keyframes.append((pts, start))
+                    last_keyframe = offset
+
+    timing_pid = video_pid if video_pid in pts_by_pid else next(
+        (pid for pid in pes_pids if pid in pts_by_pid), next(iter(pts_by_pid), None))
+    if timing_pid is not None:
+        stamps = pts_by_pid[timing_pid]
+    elif pcrs:
+        stamps = pcrs
+    else:
+        raise ValueError(f"no PTS/PCR found in {path}")
+
+    first = stamps[0]
+    # 相對第一個時間戳記展開 33-bit 迴繞；B-frame 的 PTS 可能略早於第一個
+    relative = sorted(_relative(stamp, first) for stamp in stamps)
+    # 最後一幀的長度取最常見的間隔 (時間戳記常有 1 tick 的抖動)
+    steps = Counter(b - a for a, b in zip(relative, relative[1:]) if b > a)
+    frame = steps.most_common(1)[0][0] if steps else 0
+    start_rel = relative[0]
+    end_rel = relative[-1] + frame
+
+    first_pts = (first + start_rel) % PTS_WRAP
+    points = [(max(0, (_relative(pts, first) - start_rel)) // PTS_CLOCK, byte_offset)
+              for pts, byte_offset in keyframes]
+    if points:
+        # 第一段從檔頭開始，保留檔頭的 SDT/PAT/PMT
+        points[0] = (0, 0)
+    else:
+        points = [(0, 0)]
+
+    return SegmentScan(first_pts, (first + end_rel) % PTS_WRAP,
+                       (end_rel - start_rel) // PTS_CLOCK, size, points)
+
+
+def _read_pcr_base(data, offset):
+    return (data[offset] << 25 | data[offset + 1] << 17 | data[offset + 2] << 9 |
+            data[offset + 3] << 1 | data[offset + 4] >> 7)
+
+
+def _relative(stamp, reference):
+    delta = (stamp - reference) % PTS_WRAP
+    return delta - PTS_WRAP if delta > PTS_WRAP // 2 else delta
+
+
+# ==================== 索引 ====================
+
+class _RecordView:
+    """讓 bisect 直接在 mmap 的固定長度記錄上搜尋第一個欄位"""
+
+    def __init__(self, data, record):
+        self.data = data
+        self.record = record
+        self.count = len(data) // record.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.record.unpack_from(self.data, i * self.record.size)[0]
+
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[:]
+    except FileNotFoundError:
+        return b''
+
+
+def day_name(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime(DAY_FORMAT)
+
+
+def segment_file_name(camera, start_ms):
+    return f"{camera}_{start_ms}.ts"
+
+
+class CameraIndex:
+    """單一攝影機的錄影目錄與時間索引"""
+
+    def __init__(self, archive_dir, camera):
+        self.camera = camera
+        self.root = os.path.join(archive_dir, camera)
+        self.lock = threading.Lock()
+        self.last = None        # 最後一筆 SegmentRecord，用於接續 PTS
+        self.recent = []        # 已保存的來源分段 [name, mtime_ns, size]，避免重複保存
+        self._load_state()
+
+    # ---------- 狀態 ----------
+
+    def _load_state(self):
+        days = self.days()
+        if days:
+            data = _read_file(os.path.join(self.root, days[-1], SEGMENT_INDEX))
+            if len(data) >= _SEGMENT.size:
+                self.last = SegmentRecord(*_SEGMENT.unpack_from(data, len(data) - _SEGMENT.size))
+        try:
+            with open(os.path.join(self.root, STATE_FILE)) as f:
+                self.recent = json.load(f).get('recent', [])
+        except (FileNotFoundError, ValueError):
+            self.recent = []
+
+    def _save_state(self):
+        path = os.path.join(self.root, STATE_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'recent': self.recent[-100:]}, f)
+        os.replace(path + '.tmp', path)
+
+    def days(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if d.isdigit() and len(d) == 8)
+
+    # ---------- 寫入 ----------
+
+    def archive(self, source):
+        """保存並索引一個已完成的來源分段，返回 SegmentRecord (已保存過則返回 None)"""
+        stat = os.stat(source)
+        key = [os.path.basename(source), stat.st_mtime_ns, stat.st_size]
+        with self.lock:
+            if key in self.recent:
+                return None
+
+            scan = scan_segment(source)
+            start_ms, flags = self._place(scan, stat.st_mtime_ns // 1_000_000)
+
+            day_dir = os.path.join(self.root, day_name(start_ms))
+            os.makedirs(day_dir, exist_ok=True)
+            target = os.path.join(day_dir, segment_file_name(self.camera, start_ms))
+            if not os.path.exists(target):
+                try:
+                    # hard link 不複製資料；ffmpeg 刪除原檔後仍保留
+                    os.link(source, target)
+                except OSError:
+                    shutil.copy2(source, target)
+
+            points_path = os.path.join(day_dir, POINT_INDEX)
+            with open(points_path, 'ab') as f:
+                first_point = f.tell() // _POINT.size
+                f.write(b''.join(_POINT.pack(start_ms + t, offset) for t, offset in scan.points))
+
+            record = SegmentRecord(start_ms, scan.end_pts, scan.duration_ms, scan.size,
+                                   first_point, len(scan.points), flags)
+            with open(os.path.join(day_dir, SEGMENT_INDEX), 'ab') as f:
+                f.write(_SEGMENT.pack(*record))
+
+            self.last = record
+            self.recent.append(key)
+            self.recent = self.recent[-100:]
+            self._save_state()
+            return record
+
+    def _place(self, scan, mtime_ms):
+        """決定分段的牆鐘起點：PTS 連續時接續上一段，否則以檔案時間 (寫完時刻) 推算"""
+        estimate = mtime_ms - scan.duration_ms
+        last = self.last
+        if last is not None:
+            gap = _relative(scan.first_pts, last.end_pts) / PTS_CLOCK
+            chained = last.start_ms + last.duration_ms + round(gap)
+            if 0 <= gap <= MAX_GAP_MS and abs(chained - estimate) <= RESYNC_MS:
+                return chained, 0
+        return estimate, FLAG_DISCONTINUITY
+
+    # ---------- 查詢 ----------
+
+    def segments(self, start_ms, end_ms):
+        """產出與 [start_ms, end_ms) 重疊的 (day, SegmentRecord, points)，略過已被清除的檔案"""
+        first_day = day_name(start_ms - DAY_MS)  # 跨日的最後一段
+        for day in self.days():
+            if day < first_day or day > day_name(end_ms):
+                continue
+            day_dir = os.path.join(self.root, day)
+            data = _read_file(os.path.join(day_dir, SEGMENT_INDEX))
+            if not data:
+                continue
+            view = _RecordView(data, _SEGMENT)
+            points = None
+            # 分段依起點排序；往前一段以涵蓋起點落在區間之前的分段
+            i = max(0, bisect.bisect_right(view, start_ms) - 1)
+            while i < len(view):
+                record = SegmentRecord(*_SEGMENT.unpack_from(data, i * _SEGMENT.size))
+                i += 1
+                if record.start_ms >= end_ms:
+                    break
+                if record.start_ms + record.duration_ms <= start_ms:
+                    continue
+                if not os.path.exists(os.path.join(day_dir, segment_file_name(self.camera, record.start_ms))):
+                    continue
+                if points is None:
+                    points = _read_file(os.path.join(day_dir, POINT_INDEX))
+                yield day, record, [
+                    _POINT.unpack_from(points, (record.first_point + k) * _POINT.size)
+                    for k in range(record.point_count)
+                    if (record.first_point + k + 1) * _POINT.size <= len(points)
+                ]
+
+    def time_range(self):
+        """返回 (最早 ms, 最晚 ms, 分段數, 位元組數)；沒有錄影時返回 None"""
+        earliest = latest = None
+        count = size = 0
+        for day in self.days():
+            data = _read_file(os.path.join(self.root, day, SEGMENT_INDEX))
+            for record in map(SegmentRecord._make, _SEGMENT.iter_unpack(data)):
+                if not os.path.exists(os.path.join(self.root, day,
+                                                   segment_file_name(self.camera, record.start_ms))):
+                    continue
+                if earliest is None:
+                    earliest = record.start_ms
+                latest = record.start_ms + record.duration_ms
+                count += 1
+                size += record.size
+        return None if earliest is None else (earliest, latest, count, size)
+
+
+class RecordingArchive:
+    """recordings/ 下所有攝影機"""
+
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self.cameras = {}
+        self.lock = threading.Lock()
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def camera(self, name):
+        with self.lock:
+            index = self.cameras.get(name)
+            if index is None:
+                index = self.cameras[name] = CameraIndex(self.archive_dir, name)
+            return index
+
+    def camera_names(self):
+        return sorted(d for d in os.listdir(self.archive_dir)
+                      if os.path.isdir(os.path.join(self.archive_dir, d)))
+
+    # ==================== 保存期限 ====================
+
+    def enforce_retention(self, retention_hours=None, max_bytes=None, now_ms=None):
+        """刪除超過保存期限的分段，總容量超過上限時由最舊的開始刪除；返回刪除的檔案數"""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        cutoff = now_ms - retention_hours * 3_600_000 if retention_hours else None
+
+        files = []  # (start ms, path, size)
+        for camera in self.camera_names():
+            for path in glob.glob(os.path.join(self.archive_dir, camera, '*', '*.ts')):
+                found = _ARCHIVED_SEGMENT.search(path)
+                if found:
+                    files.append((int(found.group('start')), path, os.path.getsize(path)))
+        files.sort()
+
+        total = sum(size for _, _, size in files)
+        removed = 0
+        for start_ms, path, size in files:
+            expired = cutoff is not None and start_ms < cutoff
+            over = max_bytes is not None and total > max_bytes
+            if not (expired or over):
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+            day_dir = os.path.dirname(path)
+            if not glob.glob(os.path.join(day_dir, '*.ts')):
+                shutil.rmtree(day_dir, ignore_errors=True)
+        return removed
+
+
+# ==================== VOD 播放清單 ====================
+
+def build_playlist(archive, camera, start_ms, end_ms, byterange=False, base_url='/recordings'):
+    """產生 [start_ms, end_ms) 的 VOD 播放清單；byterange=True 時以關鍵幀切成 byte range"""
+    index = archive.camera(camera)
+    entries = []    # (uri, start ms, duration ms, byte range, discontinuity)
+    previous_end = None
+
+    for day, record, points in index.segments(start_ms, end_ms):
+        uri = f"{base_url}/{camera}/{day}/{segment_file_name(camera, record.start_ms)}"
+        segment_end = record.start_ms + record.duration_ms
+        discontinuity = previous_end is not None and (
+            bool(record.flags & FLAG_DISCONTINUITY) or abs(record.start_ms - previous_end) > 1000)
+        previous_end = segment_end
+
+        if not byterange or len(points) < 2:
+            entries.append((uri, record.start_ms, record.duration_ms, None, discontinuity))
+            continue
+
+        bounds = points + [(segment_end, record.size)]
+        for (part_start, offset), (part_end, next_offset) in zip(bounds, bounds[1:]):
+            if part_end <= start_ms or part_start >= end_ms or next_offset <= offset:
+                continue
+            entries.append((uri, part_start, part_end - part_start,
+                            (next_offset - offset, offset), discontinuity))
+            discontinuity = False
+
+    if not entries:
+        return None
+
+    target = max(1, math.ceil(max(duration for _, _, duration, _, _ in entries) / 1000))
+    lines = [
+        '#EXTM3U',
+        f'#EXT-X-VERSION:{4 if byterange else 3}',
+        f'#EXT-X-TARGETDURATION:{target}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    offset = start_ms - entries[0][1]
+    if offset > 0:
+        # 播放器從要求的毫秒開始，而不是第一個分段的開頭
+        lines.append(f'#EXT-X-START:TIME-OFFSET={offset / 1000:.3f},PRECISE=YES')
+
+    for uri, part_start, duration, byte_range, discontinuity in entries:
+        if discontinuity:
+            lines.append('#EXT-X-DISCONTINUITY')
+        lines.append(f'#EXT-X-PROGRAM-DATE-TIME:{format_cot_time(part_start / 1000)}')
+        lines.append(f'#EXTINF:{duration / 1000:.3f},')
+        if byte_range:
+            lines.append(f'#EXT-X-BYTERANGE:{byte_range[0]}@{byte_range[1]}')
+        lines.append(uri)
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def parse_time(value):
+    """epoch 毫秒或 ISO 8601 (可帶 Z) 轉為 epoch 毫秒"""
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+# ==================== 監看 streams/ ====================
+
+def _playlist_segments(path):
+    """直播清單中列出的分段 (ffmpeg 只在分段寫完後才加入清單)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except FileNotFoundError:
+        return []
+
+
+def _segment_number(path):
+    found = _SOURCE_SEGMENT.match(os.path.basename(path))
+    return int(found.group('number')) if found else 0
+
+
+def archive_pending(archive, streams_dir, completed_only=True):
+    """保存 streams/ 中尚未保存的分段，返回新保存的數量
+
+    completed_only=True 時只處理直播清單列出的分段；False 時處理所有 {camera}_NNN.ts
+    (離線掃描，串流已停止時使用)。
+    """
+    sources = {}
+    if completed_only:
+        for playlist in glob.glob(os.path.join(streams_dir, '*.m3u8')):
+            camera = os.path.splitext(os.path.basename(playlist))[0]
+            sources[camera] = [os.path.join(streams_dir, name) for name in _playlist_segments(playlist)]
+    else:
+        for path in glob.glob(os.path.join(streams_dir, '*.ts')):
+            found = _SOURCE_SEGMENT.match(os.path.basename(path))
+            if found:
+                sources.setdefault(found.group('camera'), []).append(path)
+
+    archived = 0
+    for camera, paths in sources.items():
+        index = archive.camera(camera)
+        # 依 ffmpeg 的序號排序 (序號可能超過三位數)
+        paths.sort(key=_segment_number)
+        for path in paths:
+            try:
+                if index.archive(path):
+                    archived += 1
+            except FileNotFoundError:
+                continue  # 已被 ffmpeg 刪除
+            except ValueError as e:
+                print(f"⚠️ Skipping {path}: {e}")
+    return archived
+
+
+def watch(archive, streams_dir, interval=1.0, retention_hours=None, max_bytes=None,
+          retention_interval=60.0):
+    print(f"👀 Watching {streams_dir} -> {archive.archive_dir}")
+    if retention_hours or max_bytes:
+        print(f"   Retention: {retention_hours or '∞'} h, "
+              f"{f'{max_bytes / 1024 ** 3:g} GB' if max_bytes else 'no size limit'}")
+    last_retention = 0.0
+    while True:
+        archived = archive_pending(archive, streams_dir)
+        if archived:
+            print(f"📼 Archived {archived} segment(s)")
+        if (retention_hours or max_bytes) and time.monotonic() - last_retention >= retention_interval:
+            last_retention = time.monotonic()
+            removed = archive.enforce_retention(retention_hours, max_bytes)
+            if removed:
+                print(f"🧹 Removed {removed} expired segment(s)")
+        time.sleep(interval)
+
+
+# ==================== HTTP ====================
+
+class PlaybackServer:
+    """在背景執行緒提供播放清單、錄影範圍與分段檔案 (支援 Range)"""
+
+    def __init__(self, archive, port=DEFAULT_HTTP_PORT, host='0.0.0.0'):
+        archive_ref = archive
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                path = unquote(url.path)
+                try:
+                    if path == '/cameras':
+                        self._send_cameras()
+                    elif path.startswith('/vod/') and path.endswith('.m3u8'):
+                        self._send_playlist(path[len('/vod/'):-len('.m3u8')], query)
+                    elif path.startswith('/recordings/'):
+                        self._send_segment(path[len('/recordings/'):])
+                    else:
+                        self.send_error(404)
+                except ValueError as e:
+                    self.send_error(400, str(e))
+
+            def _send_cameras(self):
+                cameras = {}
+                for camera in archive_ref.camera_names():
+                    found = archive_ref.camera(camera).time_range()
+                    if found:
+                        cameras[camera] = dict(zip(('startMs', 'endMs', 'segments', 'bytes'), found))
+                self._send(200, 'application/json', json.dumps(cameras).encode('utf-8'))
+
+            def _send_playlist(self, camera, query):
+                if '/' in camera or camera.startswith('.'):
+                    raise ValueError('invalid camera')
+                start_ms = parse_time(query['start'][0])
+                end_ms = parse_time(query['end'][0]) if 'end' in query else start_ms + 3_600_000
+                byterange = query.get('byterange', ['0'])[0] in ('1', 'true')
+                playlist = build_playlist(archive_ref, camera, start_ms, end_ms, byterange)
+                if playlist is None:
+                    self.send_error(404, 'no recordings in range')
+                    return
+                self._send(200, 'application/vnd.apple.mpegurl', playlist.encode('utf-8'))
+
+            def _send_segment(self, relative):
+                root = os.path.realpath(archive_ref.archive_dir)
+                path = os.path.realpath(os.path.join(root, relative))
+                if not path.startswith(root + os.sep) or not path.endswith('.ts') or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                size = os.path.getsize(path)
+                start, end = 0, size - 1
+                status = 200
+                found = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+                if found and (found.group(1) or found.group(2)):
+                    if found.group(1):
+                        start = int(found.group(1))
+                        end = min(int(found.group(2)), size - 1) if found.group(2) else size - 1
+                    else:
+                        start = max(0, size - int(found.group(2)))
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.end_headers()
+                        return
+                    status = 206
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'video/mp2t')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                self.end_headers()
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        chunk = f.read(min(remaining, 256 * 1024))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        remaining -= len(chunk)
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"🎞️  Playback API at http://localhost:{self.port}/vod/<camera>.m3u8?start=<ms>&end=<ms>")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HLS recording indexer and VOD playlist service')
+    parser.add_argument('command', choices=['watch', 'scan', 'playlist'],
+                        help='watch: archive and index live segments; scan: archive existing segments; '
+                             'playlist: print a VOD playlist')
+    parser.add_argument('--streams', default=DEFAULT_STREAMS_DIR,
+                        help='ffmpeg HLS output directory (default: backend/streams)')
+    parser.add_argument('--archive', default=DEFAULT_ARCHIVE_DIR,
+                        help='Recording directory (default: backend/recordings)')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Seconds between scans of the streams directory (default: 1)')
+    parser.add_argument('--retention-hours', type=float, default=None,
+                        help='Delete recordings older than this many hours (default: keep)')
+    parser.add_argument('--max-gb', type=float, default=None,
+                        help='Delete the oldest recordings above this total size (default: no limit)')
+    parser.add_argument('--http-port', type=int, default=None,
+                        help=f'Serve playlists and segments on this port (e.g. {DEFAULT_HTTP_PORT})')
+    parser.add_argument('--camera', help='Camera / stream ID for playlist')
+    parser.add_argument('--start', help='Window start for playlist (epoch ms or ISO 8601)')
+    parser.add_argument('--end', help='Window end for playlist (epoch ms or ISO 8601)')
+    parser.add_argument('--byterange', action='store_true',
+                        help='Split segments into keyframe byte ranges (EXT-X-BYTERANGE)')
+    parser.add_argument('--base-url', default='/recordings',
+                        help='URL prefix of segment URIs in playlists (default: /recordings)')
+    args = parser.parse_args()
+
+    archive = RecordingArchive(args.archive)
+    max_bytes = int(args.max_gb * 1024 ** 3) if args.max_gb else None
+
+    if args.command == 'scan':
+        start = time.perf_counter()
+        archived = archive_pending(archive, args.streams, completed_only=False)
+        print(f"✅ Archived {archived} segment(s) in {time.perf_counter() - start:.2f}s")
+        for camera in archive.camera_names():
+            found = archive.camera(camera).time_range()
+            if found:
+                print(f"   {camera}: {format_cot_time(found[0] / 1000)} - "
+                      f"{format_cot_time(found[1] / 1000)} ({found[2]} segments, {found[3]} bytes)")
+        return
+
+    if args.command == 'playlist':
+        if not (args.camera and args.start and args.end):
+            parser.error('playlist requires --camera, --start and --end')
+        playlist = build_playlist(archive, args.camera, parse_time(args.start), parse_time(args.end),
+                                  args.byterange, args.base_url)
+        if playlist is None:
+            print(f"⚠️ No recordings for {args.camera} in that window")
+            return
+        print(playlist, end='')
+        return
+
+    server = PlaybackServer(archive, args.http_port).start() if args.http_port else None
+    try:
+        watch(archive, args.streams, args.interval, args.retention_hours, max_bytes)
+    except KeyboardInterrupt:
+        print("\n⚠️ Interrupted by user")
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""端到端延遲基準測試：MQTT 發布 → server.cjs → WebSocket 廣播
+
+每則 GPS 消息帶序號與單調時鐘發送時間，並以 (deviceId, lat, lng) 對應回
+`device_update`；CoT 消息把序號寫在 <remarks> 中，對應回 `cot_update`。
+
+用法:
+    python mqtt_publish.py bench-latency --broker test.mosquitto.org --topic-prefix myapp/ \\
+        --rates 10,50,100 --device-counts 1,10 --duration 30 --output latency.json
+"""
+import json
+import logging
+import math
+import re
+import threading
+import time
+
+import websocket
+
+from mqtt_publish import MQTTPublisher, MQTT_BROKER, MQTT_PORT
+
+logger = logging.getLogger('mqtt_publish')
+
+COT_SEQ_PATTERN = re.compile(r'bench-seq=(\d+)')
+# 結束發送後等待遲到消息的時間 (秒)
+DRAIN_TIMEOUT = 3
+# 對應座標時的精度，避免浮點數往返造成誤差
+COORD_DIGITS = 7
+
+
+def percentile(values, pct):
+    """最近秩百分位數；values 需已排序"""
+    if not values:
+        return None
+    rank = math.ceil(pct / 100 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+
+class LatencyTracker:
+    """記錄已發送的消息並與 WebSocket 回傳事件配對"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}        # key -> (kind, device_id, seq, sent)
+        self.sent = {}           # kind -> count
+        self.latencies = {}      # kind -> [ms]
+        self.reordered = {}      # kind -> count
+        self.last_seq = {}       # (kind, device_id) -> seq
+
+    def expect(self, kind, key, device_id, seq, sent):
+        with self.lock:
+            self.pending[key] = (kind, device_id, seq, sent)
+            self.sent[kind] = self.sent.get(kind, 0) + 1
+
+    def match(self, key, received):
+        with self.lock:
+            entry = self.pending.pop(key, None)
+            if entry is None:
+                return False
+
+            kind, device_id, seq, sent = entry
+            self.latencies.setdefault(kind, []).append((received - sent) * 1000)
+
+            last = self.last_seq.get((kind, device_id))
+            if last is not None and seq < last:
+                self.reordered[kind] = self.reordered.get(kind, 0) + 1
+            else:
+                self.last_seq[(kind, device_id)] = seq
+            return True
+
+    def on_event(self, event, received):
+        """處理一則 WebSocket 事件"""
+        event_type = event.get('type')
+
+        if event_type == 'device_update':
+            device = event.get('device') or {}
+            position = device.get('position') or {}
+            try:
+                key = ('gps', device.get('id'),
+                       round(float(position['lat']), COORD_DIGITS),
+                       round(float(position['lng']), COORD_DIGITS))
+            except (KeyError, TypeError, ValueError):
+                return
+            self.match(key, received)
+
+        elif event_type == 'cot_update':
+            found = COT_SEQ_PATTERN.search(json.dumps(event.get('message')))
+            if found:
+                self.match(('cot', int(found.group(1))), received)
+
+    def report(self):
+        with self.lock:
+            result = {}
+            for kind, sent in sorted(self.sent.items()):
+                values = sorted(self.latencies.get(kind, []))
+                received = len(values)
+                result[kind] = {
+                    'sent': sent,
+                    'received': received,
+                    'loss': round((sent - received) / sent * 100, 2) if sent else 0.0,
+                    'reordered': self.reordered.get(kind, 0),
+                    'p50_ms': _round(percentile(values, 50)),
+                    'p95_ms': _round(percentile(values, 95)),
+                    'p99_ms': _round(percentile(values, 99)),
+                    'max_ms': _round(values[-1] if values else None)
+                }
+            return result
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+class WebSocketListener:
+    """在背景執行緒接收後端 WebSocket 廣播"""
+
+    def __init__(self, url, tracker):
+        self.url = url
+        self.tracker = tracker
+        self.ws = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        self.ws = websocket.create_connection(self.url, timeout=5)
+        self.ws.settimeout(0.5)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            try:
+                raw = self.ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except websocket.WebSocketException:
+                break
+
+            received = time.monotonic()
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            self.tracker.on_event(event, received)
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        if self.ws:
+            self.ws.close()
+
+
+def run_case(publisher, ws_url, rate, devices, duration):
+    """以固定速率輪流為每個設備發送 GPS 與 CoT，返回延遲統計"""
+    tracker = LatencyTracker()
+    listener = WebSocketListener(ws_url, tracker)
+    listener.start()
+
+    # 每個設備獨立的座標，確保每則 GPS 的 (lat, lng) 唯一
+    positions = [[24.99 + i * 0.001, 121.29] for i in range(devices)]
+    period = 1.0 / rate
+    seq = 0
+    start = time.monotonic()
+    next_send = start
+
+    try:
+        while time.monotonic() - start < duration:
+            device_index = seq % devices
+            device_id = f"bench-{device_index:04d}"
+            position = positions[device_index]
+            position[1] += 0.000001
+            lat = round(position[0], COORD_DIGITS)
+            lon = round(position[1], COORD_DIGITS)
+
+            sent = time.monotonic()
+            # 依設備的第幾輪交替 GPS / CoT，設備數為偶數時每個設備仍兩種都會送
+            if (seq // devices) % 2 == 0:
+                tracker.expect('gps', ('gps', device_id, lat, lon), device_id, seq, sent)
+                publisher.publish_gps_update(
+                    lat, lon, 0, device_id,
+                    extra={"seq": seq, "sentAt": sent}
+                )
+            else:
+                tracker.expect('cot', ('cot', seq), device_id, seq, sent)
+                publisher.publish_cot_message(
+                    uid=device_id,
+                    lat=lat,
+                    lon=lon,
+                    callsign=device_id,
+                    remarks=f"bench-seq={seq}"
+                )
+            seq += 1
+
+            next_send += period
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        time.sleep(DRAIN_TIMEOUT)
+    finally:
+        listener.stop()
+
+    elapsed = time.monotonic() - start - DRAIN_TIMEOUT
+    return {
+        'rate': rate,
+        'devices': devices,
+        'achieved_rate': round(seq / elapsed, 1) if elapsed > 0 else 0.0,
+        'kinds': tracker.report()
+    }
+
+
+def format_table(results):
+    header = (f"{'rate':>7} {'devices':>7} {'kind':>4} {'sent':>7} {'recv':>7} {'loss%':>6} "
+              f"{'reord':>5} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}")
+    lines = [header, '-' * len(header)]
+
+    def cell(value):
+        return '-' if value is None else f"{value:.1f}"
+
+    for case in results:
+        for kind, stats in case['kinds'].items():
+            lines.append(
+                f"{case['rate']:>7g} {case['devices']:>7} {kind:>4} {stats['sent']:>7} "
+                f"{stats['received']:>7} {stats['loss']:>6.1f} {stats['reordered']:>5} "
+                f"{cell(stats['p50_ms']):>8} {cell(stats['p95_ms']):>8} "
+                f"{cell(stats['p99_ms']):>8} {cell(stats['max_ms']):>8}"
+            )
+    return '\n'.join(lines)
+
+
+def run_latency_benchmark(broker=MQTT_BROKER, port=MQTT_PORT, topic_prefix="",
+                          ws_url='ws://localhost:4001', rates=(10,), device_counts=(1,),
+                          duration=30, output=None, metrics=None):
+    """對每組 (速率, 設備數) 執行一次測試，輸出表格並可寫入 JSON"""
+    publisher = MQTTPublisher(broker, port, verbose=False, topic_prefix=topic_prefix,
+                              metrics=metrics)
+    if not publisher.connect():
+        logger.error("❌ Failed to connect to MQTT broker")
+        return None
+
+    results = []
+    try:
+        for devices in device_counts:
+            for rate in rates:
+                logger.info(f"⏱️  Measuring {rate:g} msg/s with {devices} device(s) for {duration}s...")
+                results.append(run_case(publisher, ws_url, rate, devices, duration))
+    finally:
+        publisher.disconnect()
+
+    report = {
+        'broker': f"{broker}:{port}",
+        'topicPrefix': topic_prefix,
+        'wsUrl': ws_url,
+        'duration': duration,
+        'results': results
+    }
+
+    logger.info(format_table(results))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"💾 Report written to {output}")
+    return report
@@ -1,30 +1,70 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
 import time
+import logging
 import argparse
 import random
+import socket
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import paho.mqtt.client as mqtt
 
+from bundle_codec import BundleRecord, encode_bundle
+from cot_encoder import get_encoder, frame_mesh
+from publish_pipeline import PublishPipeline, PublishHandle, BACKPRESSURE_BLOCK
+from publisher_metrics import PublisherMetrics, MetricsServer, SummaryReporter
+from reporting_policy import ReportingPolicy
+
+logger = logging.getLogger('mqtt_publish')
+
 # MQTT Configuration
 MQTT_BROKER = "118.163.141.80"
 MQTT_PORT = 1883
 MQTT_KEEPALIVE = 60
+ACK_TIMEOUT = 5
 
 # Topics
 TOPIC_CAMERA_CONTROL = "camera/control"
 TOPIC_CAMERA_STATUS = "camera/status"
 TOPIC_CAMERA_GPS = "camera/gps"
 TOPIC_COT_MESSAGE = "cot/message"
+TOPIC_COT_PROTO = "cot/proto"
 TOPIC_DEVICE_STATUS = "device/{}/status"
+TOPIC_BUNDLE = "fleet/bundle"
+
+CAMERA_ACTIONS = ['left', 'right', 'capture', 'record', 'stop']
+# 只發布一則消息的命令
+ONE_SHOT_COMMANDS = CAMERA_ACTIONS + ['status', 'gps', 'cot']
 
 class MQTTPublisher:
-    def __init__(self, broker=MQTT_BROKER, port=MQTT_PORT):
+    def __init__(self, broker=MQTT_BROKER, port=MQTT_PORT, verbose=False, topic_prefix="",
+                 policy=None, max_in_flight=100, backpressure=BACKPRESSURE_BLOCK, spool_path=None,
+                 qos=1, metrics=None):
         self.broker = broker
         self.port = port
+        self.topic_prefix = topic_prefix
+        self.policy = policy  # ReportingPolicy；None 表示每次都發布
+        self.qos = qos
         self.client = mqtt.Client()
         self.connected = False
+        self.connected_event = threading.Event()
+        self.verbose = verbose
+        # 每則消息的日誌：verbose 時為 INFO，否則為 DEBUG (預設不輸出，熱路徑只有一次等級檢查)
+        self.message_level = logging.INFO if verbose else logging.DEBUG
+        self.published_count = 0
+        self.metrics = metrics if metrics is not None else PublisherMetrics()
+        self.pipeline = PublishPipeline(
+            self.client,
+            max_in_flight=max_in_flight,
+            backpressure=backpressure,
+            block_timeout=ACK_TIMEOUT,
+            spool_path=spool_path,
+            metrics=self.metrics
+        )
         
         # Callbacks
         self.client.on_connect = self.on_connect
@@ -34,41 +74,58 @@ class MQTTPublisher:
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             self.connected = True
-            print(f"✅ Connected to MQTT Broker: {self.broker}:{self.port}")
+            self.connected_event.set()
+            self.pipeline.on_connect()
+            logger.info(f"✅ Connected to MQTT Broker: {self.broker}:{self.port}")
         else:
-            print(f"❌ Failed to connect, return code {rc}")
+            logger.error(f"❌ Failed to connect, return code {rc}")
             
     def on_disconnect(self, client, userdata, rc):
         self.connected = False
-        print(f"🔌 Disconnected from MQTT Broker")
+        self.connected_event.clear()
+        self.pipeline.on_disconnect()
+        if rc == 0:
+            logger.info("🔌 Disconnected from MQTT Broker")
+        else:
+            logger.warning(f"🔌 Disconnected from MQTT Broker unexpectedly (rc={rc})")
         
     def on_publish(self, client, userdata, mid):
-        print(f"📤 Message published (mid: {mid})")
+        self.published_count += 1
+        self.pipeline.on_publish(mid)
     
     def connect(self):
         try:
             self.client.connect(self.broker, self.port, MQTT_KEEPALIVE)
             self.client.loop_start()
             
-            # Wait for connection
-            timeout = 5
-            start_time = time.time()
-            while not self.connected and (time.time() - start_time) < timeout:
-                time.sleep(0.1)
-                
-            if not self.connected:
-                print("⚠️ Connection timeout")
+            # Wait for connection (CONNACK 到達即返回，不以固定間隔輪詢)
+            if not self.connected_event.wait(5):
+                logger.warning("⚠️ Connection timeout")
                 return False
             return True
         except Exception as e:
-            print(f"❌ Connection error: {e}")
+            logger.error(f"❌ Connection error: {e}")
             return False
     
     def disconnect(self):
-        self.client.loop_stop()
+        # 先等待在途消息確認，取代固定的 sleep
+        if self.connected and not self.pipeline.flush(ACK_TIMEOUT):
+            logger.warning(f"⚠️ {self.pipeline.depth} message(s) not acknowledged before disconnect")
+        # 先送出 DISCONNECT 再停止網路迴圈，loop_stop 不必等待 select 逾時
         self.client.disconnect()
+        self.client.loop_stop()
+        self.pipeline.close()
+    
+    def _publish(self, topic, payload, qos=None, wait=False):
+        """經由發布管線送出消息，返回 PublishHandle；wait=True 時等待 broker 確認 (PUBACK)"""
+        if qos is None:
+            qos = self.qos
+        handle = self.pipeline.submit(self.topic_prefix + topic, payload, qos)
+        if wait:
+            handle.wait(ACK_TIMEOUT)
+        return handle
     
-    def publish_camera_command(self, action, device_id="camera_1"):
+    def publish_camera_command(self, action, device_id="camera_1", wait=False):
         """發布攝像頭控制指令"""
         payload = {
             "action": action,
@@ -76,16 +133,12 @@ class MQTTPublisher:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
-        result = self.client.publish(
-            TOPIC_CAMERA_CONTROL,
-            json.dumps(payload),
-            qos=1
-        )
+        result = self._publish(TOPIC_CAMERA_CONTROL, json.dumps(payload), wait=wait)
         
-        print(f"📸 Camera command published: {action}")
-        return result.is_published()
+        logger.log(self.message_level, "📸 Camera command published: %s", action)
+        return result
     
-    def publish_gps_update(self, lat, lon, alt=0, device_id="camera_1"):
+    def publish_gps_update(self, lat, lon, alt=0, device_id="camera_1", wait=False, extra=None):
         """發布 GPS 位置更新"""
         payload = {
             "deviceId": device_id,
@@ -96,16 +149,16 @@ class MQTTPublisher:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
-        result = self.client.publish(
-            TOPIC_CAMERA_GPS,
-            json.dumps(payload),
-            qos=1
-        )
+        if extra:
+            payload.update(extra)
+        
+        result = self._publish(TOPIC_CAMERA_GPS, json.dumps(payload), wait=wait)
         
-        print(f"📍 GPS update published: {lat}, {lon}")
-        return result.is_published()
+        logger.log(self.message_level, "📍 GPS update published: %s, %s", lat, lon)
+        return result
     
-    def publish_device_status(self, device_id, status="active", battery=None, signal=None):
+    def publish_device_status(self, device_id, status="active", battery=None, signal=None,
+                              wait=False, extra=None):
         """發布設備狀態"""
         payload = {
             "deviceId": device_id,
@@ -117,48 +170,78 @@ class MQTTPublisher:
             payload["battery"] = battery
         if signal is not None:
             payload["signal"] = signal
+        if extra:
+            payload.update(extra)
         
         topic = TOPIC_DEVICE_STATUS.format(device_id)
-        result = self.client.publish(
-            topic,
-            json.dumps(payload),
-            qos=1
-        )
+        result = self._publish(topic, json.dumps(payload), wait=wait)
         
-        print(f"📊 Device status published: {device_id} - {status}")
-        return result.is_published()
+        logger.log(self.message_level, "📊 Device status published: %s - %s", device_id, status)
+        return result
     
     def publish_cot_message(self, uid, lat, lon, alt=0, cot_type="a-f-G-U-C", 
-                           callsign="Unknown", remarks=""):
-        """發布 CoT (Cursor on Target) 消息"""
-        now = datetime.now(timezone.utc)
-        stale = datetime.fromtimestamp(now.timestamp() + 300, timezone.utc)  # 5 minutes
-        
-        cot_xml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<event version="2.0" uid="{uid}" type="{cot_type}" how="h-e" 
-       time="{now.isoformat()}" start="{now.isoformat()}" stale="{stale.isoformat()}">
-  <point lat="{lat}" lon="{lon}" hae="{alt}" ce="9999999.0" le="9999999.0"/>
-  <detail>
-    <contact callsign="{callsign}"/>
-    <remarks>{remarks}</remarks>
-    <status battery="85" />
-    <precisionlocation geopointsrc="GPS" altsrc="GPS"/>
-  </detail>
-</event>'''
-        
-        result = self.client.publish(
-            TOPIC_COT_MESSAGE,
-            cot_xml,
-            qos=1
+                           callsign="Unknown", remarks="", wait=False, battery=None,
+                           encoding="xml"):
+        """發布 CoT (Cursor on Target) 消息；encoding="proto" 時以 TAK Protocol v1 發布到 cot/proto"""
+        encoder = get_encoder(cot_type)
+        
+        if encoding == "proto":
+            payload = frame_mesh(encoder.encode_proto(uid, lat, lon, alt, callsign, remarks, battery))
+            result = self._publish(TOPIC_COT_PROTO, payload, wait=wait)
+        else:
+            payload = encoder.encode_xml(uid, lat, lon, alt, callsign, remarks, battery)
+            result = self._publish(TOPIC_COT_MESSAGE, payload, wait=wait)
+        
+        logger.log(self.message_level, "🎯 CoT message published: %s (%s)", uid, callsign)
+        return result
+    
+    def publish_bundle(self, records, wait=False):
+        """發布多個設備的二進位 bundle (位置 + 電量 + 信號 + 狀態合併為一則消息)"""
+        result = self._publish(TOPIC_BUNDLE, encode_bundle(records), wait=wait)
+        
+        logger.log(self.message_level, "📦 Bundle published: %d device(s)", len(records))
+        return result
+    
+    def report_position(self, device_id, lat, lon, alt=0, callsign=None, remarks="",
+                        battery=None, now=None):
+        """依回報策略發布位置 (GPS + CoT)，返回實際發布的消息數"""
+        if self.policy and not self.policy.should_report_position(device_id, lat, lon, now):
+            return 0
+        
+        self.publish_gps_update(lat, lon, alt, device_id)
+        self.publish_cot_message(
+            uid=device_id,
+            lat=lat,
+            lon=lon,
+            alt=alt,
+            callsign=callsign or device_id,
+            remarks=remarks,
+            battery=battery
         )
+        return 2
+    
+    def report_status(self, device_id, status="active", battery=None, signal=None, now=None):
+        """依回報策略發布設備狀態 (未變化則略過)，返回實際發布的消息數"""
+        if self.policy and not self.policy.should_report_status(device_id, status, battery, signal, now):
+            return 0
         
-        print(f"🎯 CoT message published: {uid} ({callsign})")
-        return result.is_published()
+        self.publish_device_status(device_id, status, battery, signal)
+        return 1
+    
+    def include_in_bundle(self, record, now=None):
+        """依回報策略判斷設備是否需要加入 bundle (位置或狀態任一有變化)"""
+        if not self.policy:
+            return True
+        position = self.policy.should_report_position(record.device_id, record.lat, record.lon, now)
+        status = self.policy.should_report_status(
+            record.device_id, record.status, record.battery, record.signal, now
+        )
+        return position or status
     
-    def simulate_device_stream(self, device_id, lat, lon, duration=60, interval=5):
+    def simulate_device_stream(self, device_id, lat, lon, duration=60, interval=5, bundle=False):
         """模擬設備數據流"""
-        print(f"🔄 Starting device simulation: {device_id}")
-        print(f"   Duration: {duration}s, Interval: {interval}s")
+        logger.info(f"🔄 Starting device simulation: {device_id}")
+        logger.info(f"   Duration: {duration}s, Interval: {interval}s")
         
         start_time = time.time()
         count = 0
@@ -172,34 +255,177 @@ class MQTTPublisher:
             battery = max(0, 100 - count * 2)
             signal = random.randint(60, 100)
             
-            # Publish GPS
-            self.publish_gps_update(lat, lon, alt, device_id)
-            
-            # Publish status
             status = "active" if battery > 20 else "warning"
-            self.publish_device_status(device_id, status, battery, signal)
             
-            # Publish CoT
-            self.publish_cot_message(
-                uid=device_id,
-                lat=lat,
-                lon=lon,
-                alt=alt,
-                callsign=f"Device-{device_id}",
-                remarks=f"Simulated device at iteration {count}"
-            )
+            if bundle:
+                # GPS + 狀態合併為單一二進位消息
+                record = BundleRecord(device_id, lat, lon, alt, battery, signal, status)
+                sent = 0
+                if self.include_in_bundle(record):
+                    self.publish_bundle([record])
+                    sent = 1
+            else:
+                # Publish GPS + CoT
+                sent = self.report_position(
+                    device_id, lat, lon, alt,
+                    callsign=f"Device-{device_id}",
+                    remarks=f"Simulated device at iteration {count}",
+                    battery=battery
+                )
+                
+                # Publish status
+                sent += self.report_status(device_id, status, battery, signal)
             
             count += 1
-            print(f"   Iteration {count}: Position updated")
+            logger.log(self.message_level, "   Iteration %d: %d message(s) published", count, sent)
             time.sleep(interval)
         
-        print(f"✅ Simulation completed: {count} iterations")
+        logger.info(f"✅ Simulation completed: {count} iterations")
+        if self.policy:
+            logger.info(f"   Reporting policy: {self.policy.summary()}")
+
+
+class CommandServer:
+    """常駐發布服務：共用一條 MQTT 連線，逐行接收指令並在 broker 確認後回覆 ack
+    
+    協議：每行一個指令，可為純文字 (例如 `left`) 或 JSON
+    (例如 `{"id": 1, "command": "gps", "deviceId": "cam1", "lat": 25.0, "lon": 121.5}`)。
+    每個指令回覆一行 JSON ack：`{"id": 1, "command": "gps", "ok": true, "elapsedMs": 12.3}`。
+    """
+    
+    def __init__(self, publisher, workers=8):
+        self.publisher = publisher
+        self.workers = workers
+    
+    def execute(self, request):
+        """執行單一指令，返回 PublishHandle (ping 返回連線狀態)"""
+        command = request.get("command")
+        device_id = request.get("deviceId", "camera_1")
+        publisher = self.publisher
+        
+        if command in CAMERA_ACTIONS:
+            return publisher.publish_camera_command(command, device_id, wait=True)
+        if command == 'status':
+            return publisher.publish_device_status(
+                device_id,
+                status=request.get("status", "active"),
+                battery=request.get("battery"),
+                signal=request.get("signal"),
+                wait=True
+            )
+        if command == 'gps':
+            return publisher.publish_gps_update(
+                request["lat"], request["lon"], request.get("alt", 0), device_id, wait=True
+            )
+        if command == 'cot':
+            return publisher.publish_cot_message(
+                uid=device_id,
+                lat=request["lat"],
+                lon=request["lon"],
+                alt=request.get("alt", 0),
+                callsign=request.get("callsign", "Unknown"),
+                remarks=request.get("remarks", ""),
+                wait=True,
+                battery=request.get("battery"),
+                encoding=request.get("encoding", "xml")
+            )
+        if command == 'ping':
+            return publisher.connected
+        raise ValueError(f"unknown command: {command}")
+    
+    def handle_line(self, line):
+        """解析一行指令並返回 ack；空行返回 None"""
+        line = line.strip()
+        if not line:
+            return None
+        
+        try:
+            request = json.loads(line) if line.startswith('{') else {"command": line}
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"invalid json: {e}"}
+        
+        start = time.monotonic()
+        error = None
+        try:
+            result = self.execute(request)
+            if isinstance(result, PublishHandle):
+                ok = result.published
+                if not ok:
+                    error = f"publish {result.result() if result.done() else 'timed out'}"
+            else:
+                ok = bool(result)
+                if not ok:
+                    error = "not connected"
+        except KeyError as e:
+            ok, error = False, f"missing field: {e}"
+        except Exception as e:
+            ok, error = False, str(e)
+        
+        ack = {
+            "id": request.get("id"),
+            "command": request.get("command"),
+            "ok": ok,
+            "elapsedMs": round((time.monotonic() - start) * 1000, 1)
+        }
+        if error:
+            ack["error"] = error
+        return ack
+    
+    def serve_stdin(self):
+        """stdin/stdout 行協議；日誌改寫到 stderr，stdout 只輸出 ack"""
+        out = sys.stdout
+        sys.stdout = sys.stderr
+        write_lock = threading.Lock()
+        
+        def respond(line):
+            ack = self.handle_line(line)
+            if ack is not None:
+                with write_lock:
+                    out.write(json.dumps(ack) + "\n")
+                    out.flush()
+        
+        logger.info("🟢 Publisher daemon ready (stdin)")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for line in sys.stdin:
+                pool.submit(respond, line)
+    
+    def serve_socket(self, path):
+        """Unix socket 行協議，每個連線一個執行緒"""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError("Unix sockets are not supported on this platform, use stdin mode")
+        
+        server_self = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    ack = server_self.handle_line(raw.decode('utf-8', 'replace'))
+                    if ack is not None:
+                        self.wfile.write((json.dumps(ack) + "\n").encode('utf-8'))
+        
+        if os.path.exists(path):
+            os.unlink(path)
+        
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+            server.daemon_threads = True
+            logger.info(f"🟢 Publisher daemon ready (socket: {path})")
+            try:
+                server.serve_forever()
+            finally:
+                os.unlink(path)
 
 
 def main():
     parser = argparse.ArgumentParser(description='MQTT Publisher for CivTAK/ATAK Integration')
     parser.add_argument('command', nargs='?', default='status',
-                       help='Command: left, right, capture, status, gps, cot, simulate')
+                       help='Command: left, right, capture, record, stop, status, gps, cot, simulate, simulate-fleet, '
+                            'bench-latency, record-traffic, replay-traffic, serve')
+    parser.add_argument('--broker', default=MQTT_BROKER,
+                       help=f'MQTT broker host (default: {MQTT_BROKER})')
+    parser.add_argument('--port', type=int, default=MQTT_PORT,
+                       help=f'MQTT broker port (default: {MQTT_PORT})')
+    parser.add_argument('--topic-prefix', default='',
+                       help="Prefix for all topics, e.g. 'myapp/' to match server.cjs (default: none)")
     parser.add_argument('--device-id', default='camera_1',
                        help='Device ID (default: camera_1)')
     parser.add_argument('--lat', type=float, default=24.993861,
@@ -210,23 +436,185 @@ def main():
                        help='Altitude (default: 0)')
     parser.add_argument('--callsign', default='Unknown',
                        help='Callsign for CoT message')
+    parser.add_argument('--cot-encoding', choices=['xml', 'proto'], default='xml',
+                       help='CoT encoding: xml (cot/message) or TAK protobuf (cot/proto)')
     parser.add_argument('--duration', type=int, default=60,
                        help='Simulation duration in seconds (default: 60)')
-    parser.add_argument('--interval', type=int, default=5,
+    parser.add_argument('--interval', type=float, default=5,
                        help='Simulation interval in seconds (default: 5)')
+    parser.add_argument('--socket', default=None,
+                       help='Unix socket path for serve mode (default: stdin/stdout)')
+    parser.add_argument('--devices', type=int, default=100,
+                       help='Number of virtual devices for simulate-fleet (default: 100)')
+    parser.add_argument('--connections', type=int, default=4,
+                       help='Shared MQTT connections per worker for simulate-fleet (default: 4)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes for simulate-fleet (default: 1)')
+    parser.add_argument('--jitter', type=float, default=0.2,
+                       help='Interval jitter as a fraction of --interval (default: 0.2)')
+    parser.add_argument('--max-in-flight', type=int, default=100,
+                       help='Maximum unacknowledged messages per connection (default: 100)')
+    parser.add_argument('--backpressure', choices=['block', 'drop'], default='block',
+                       help='What to do when the in-flight window is full; simulate-fleet always drops '
+                            '(default: block)')
+    parser.add_argument('--spool', default=None,
+                       help='Append-only spool file for messages published while disconnected')
+    parser.add_argument('--deadband', action='store_true',
+                       help='Enable dead-band reporting for simulate/simulate-fleet')
+    parser.add_argument('--min-distance', type=float, default=10.0,
+                       help='Dead-band distance threshold in meters (default: 10)')
+    parser.add_argument('--max-silence', type=float, default=60.0,
+                       help='Dead-band heartbeat interval in seconds (default: 60)')
+    parser.add_argument('--bundle', action='store_true',
+                       help='Publish simulate/simulate-fleet ticks as binary bundles on fleet/bundle')
+    parser.add_argument('--bundle-window', type=float, default=1.0,
+                       help='How long simulate-fleet coalesces device ticks per bundle, in seconds (default: 1)')
+    parser.add_argument('--stationary', type=float, default=0.0,
+                       help='Fraction of simulate-fleet devices standing still (default: 0)')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for reproducible simulations')
+    parser.add_argument('--ws-url', default='ws://localhost:4001',
+                       help='Backend WebSocket URL for bench-latency (default: ws://localhost:4001)')
+    parser.add_argument('--rates', default='10',
+                       help='Comma-separated message rates (msg/s) for bench-latency (default: 10)')
+    parser.add_argument('--device-counts', default='1',
+                       help='Comma-separated device counts for bench-latency (default: 1)')
+    parser.add_argument('--output', default=None,
+                       help='Write the bench-latency report as JSON to this file')
+    parser.add_argument('--log-dir', default='traffic_logs',
+                       help='Segment directory for record-traffic/replay-traffic (default: traffic_logs)')
+    parser.add_argument('--segment-size', type=int, default=64,
+                       help='Record segment size in MB (default: 64)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                       help='Replay speed multiplier, 0 for as fast as possible (default: 1)')
+    parser.add_argument('--topic-filter', default=None,
+                       help='Comma-separated MQTT topic patterns to replay, e.g. camera/gps,device/+/status')
+    parser.add_argument('--device-filter', default=None,
+                       help='Comma-separated device IDs to replay')
+    parser.add_argument('--multiply', type=int, default=1,
+                       help='Replay each device N times with rewritten IDs (default: 1)')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default='info',
+                       help='Logging level; debug also logs every published message (default: info)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                       help='Serve Prometheus metrics on this port at /metrics (default: off)')
+    parser.add_argument('--metrics-interval', type=float, default=60.0,
+                       help='Seconds between metrics summary log lines, 0 to disable (default: 60)')
     
     args = parser.parse_args()
     
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()), format='%(message)s')
+    
+    # 注意 record 是相機動作 (CAMERA_ACTIONS)，錄製流量使用 record-traffic
+    if args.command == 'record-traffic':
+        from traffic_log import TrafficRecorder
+        
+        # 錄製只訂閱不發布，沒有發布端指標
+        # --duration 0 表示錄到 Ctrl+C 為止
+        try:
+            recorder = TrafficRecorder(
+                args.broker, args.port, args.log_dir,
+                topic_prefix=args.topic_prefix,
+                segment_size=args.segment_size * 1024 * 1024
+            )
+        except FileExistsError as e:
+            logger.error(f"❌ {e}")
+            sys.exit(1)
+        recorder.run(args.duration)
+        return
+    
+    # 所有發布路徑共用同一組指標
+    metrics = PublisherMetrics()
+    metrics_server = reporter = None
+    if args.command == 'simulate-fleet' and args.workers > 1:
+        if args.metrics_port is not None:
+            logger.warning("⚠️ Metrics are only collected for simulate-fleet with --workers 1")
+    else:
+        if args.metrics_port is not None:
+            metrics_server = MetricsServer(metrics, args.metrics_port).start()
+        if args.metrics_interval > 0:
+            reporter = SummaryReporter(metrics, args.metrics_interval).start()
+    
+    try:
+        _run_command(args, metrics)
+    finally:
+        if reporter:
+            reporter.stop()
+        if metrics_server:
+            metrics_server.stop()
+
+
+def _run_command(args, metrics):
+    """執行發布類命令，所有 MQTTPublisher 都記錄到 metrics"""
+    if args.command == 'simulate-fleet':
+        # 車隊模擬自行管理連線池
+        from fleet_simulator import FleetConfig, run_fleet
+        
+        config = FleetConfig(
+            devices=args.devices,
+            connections=args.connections,
+            workers=args.workers,
+            lat=args.lat,
+            lon=args.lon,
+            duration=args.duration,
+            interval=args.interval,
+            jitter=args.jitter,
+            seed=args.seed,
+            broker=args.broker,
+            port=args.port,
+            topic_prefix=args.topic_prefix,
+            stationary=args.stationary,
+            deadband=args.deadband,
+            min_distance=args.min_distance,
+            max_silence=args.max_silence,
+            bundle=args.bundle,
+            bundle_window=args.bundle_window,
+            max_in_flight=args.max_in_flight
+        )
+        try:
+            run_fleet(config, metrics if args.workers <= 1 else None)
+        except KeyboardInterrupt:
+            logger.warning("\n⚠️ Interrupted by user")
+        return
+    
+    if args.command == 'bench-latency':
+        from latency_benchmark import run_latency_benchmark
+        
+        run_latency_benchmark(
+            broker=args.broker,
+            port=args.port,
+            topic_prefix=args.topic_prefix,
+            ws_url=args.ws_url,
+            rates=[float(r) for r in args.rates.split(',')],
+            device_counts=[int(d) for d in args.device_counts.split(',')],
+            duration=args.duration,
+            output=args.output,
+            metrics=metrics
+        )
+        return
+    
     # Create publisher
-    publisher = MQTTPublisher()
+    policy = None
+    if args.deadband:
+        policy = ReportingPolicy(min_distance=args.min_distance, max_silence=args.max_silence)
+    publisher = MQTTPublisher(
+        args.broker, args.port,
+        # 只有單次命令逐則記錄；simulate / replay-traffic / serve 為高頻路徑，只在 --log-level debug 時輸出
+        verbose=args.command in ONE_SHOT_COMMANDS,
+        topic_prefix=args.topic_prefix,
+        policy=policy,
+        max_in_flight=args.max_in_flight,
+        backpressure=args.backpressure,
+        spool_path=args.spool,
+        metrics=metrics
+    )
     
     if not publisher.connect():
-        print("❌ Failed to connect to MQTT broker")
+        logger.error("❌ Failed to connect to MQTT broker")
         sys.exit(1)
     
     try:
         # Process command
-        if args.command in ['left', 'right', 'capture']:
+        if args.command in CAMERA_ACTIONS:
             publisher.publish_camera_command(args.command, args.device_id)
             
         elif args.command == 'status':
@@ -248,7 +636,8 @@ def main():
                 lat=args.lat,
                 lon=args.lon,
                 alt=args.alt,
-                callsign=args.callsign
+                callsign=args.callsign,
+                encoding=args.cot_encoding
             )
             
         elif args.command == 'simulate':
@@ -257,32 +646,50 @@ def main():
                 args.lat,
                 args.lon,
                 duration=args.duration,
-                interval=args.interval
+                interval=args.interval,
+                bundle=args.bundle
             )
             
+        elif args.command == 'replay-traffic':
+            from traffic_log import replay
+            
+            replay(
+                publisher,
+                args.log_dir,
+                speed=args.speed,
+                topic_filters=args.topic_filter.split(',') if args.topic_filter else None,
+                device_filters=args.device_filter.split(',') if args.device_filter else None,
+                multiply=args.multiply
+            )
+            
+        elif args.command == 'serve':
+            server = CommandServer(publisher)
+            if args.socket:
+                server.serve_socket(args.socket)
+            else:
+                server.serve_stdin()
+            
         else:
-            print(f"⚠️ Unknown command: {args.command}")
-            print("Available commands: left, right, capture, status, gps, cot, simulate")
-        
-        # Wait a bit for messages to be sent
-        time.sleep(1)
+            logger.warning(f"⚠️ Unknown command: {args.command}")
+            logger.info("Available commands: left, right, capture, record, stop, status, gps, cot, "
+                        "simulate, simulate-fleet, bench-latency, record-traffic, replay-traffic, serve")
         
     except KeyboardInterrupt:
-        print("\n⚠️ Interrupted by user")
+        logger.warning("\n⚠️ Interrupted by user")
     except Exception as e:
-        print(f"❌ Error: {e}")
+        logger.error(f"❌ Error: {e}")
     finally:
         publisher.disconnect()
-        print("👋 Disconnected")
+        logger.info("👋 Disconnected")
 
 
 if __name__ == "__main__":
     # For backward compatibility with simple command line usage
     if len(sys.argv) == 2 and sys.argv[1] in ['left', 'right', 'capture']:
-        publisher = MQTTPublisher()
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+        publisher = MQTTPublisher(verbose=True)
         if publisher.connect():
             publisher.publish_camera_command(sys.argv[1])
-            time.sleep(1)
             publisher.disconnect()
     else:
         main()
\ No newline at end of file
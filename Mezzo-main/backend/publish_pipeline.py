@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""非阻塞發布管線：在途視窗、背壓、批次確認與斷線時的磁碟隊列
+
+每次發布返回 PublishHandle (concurrent.futures.Future)，在 broker 確認 (PUBACK)
+後完成。在途消息數受 max_in_flight 限制，視窗滿時依背壓策略阻塞或丟棄。
+斷線期間消息寫入 append-only 的磁碟隊列，重新連線後依序送出。
+若提供 PublisherMetrics，送出、確認延遲與連線事件會一併記錄。
+"""
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import paho.mqtt.client as mqtt
+
+PUBLISHED = "published"
+DROPPED = "dropped"
+SPOOLED = "spooled"
+
+BACKPRESSURE_BLOCK = "block"
+BACKPRESSURE_DROP = "drop"
+
+# 確認執行緒的批次間隔 (秒)
+CONFIRM_INTERVAL = 0.05
+# 每讀取多少筆磁碟隊列記錄就保存一次讀取位置
+OFFSET_SAVE_EVERY = 100
+# 連線期間重送磁碟隊列的退避範圍 (秒)
+DRAIN_RETRY_MIN = 0.5
+DRAIN_RETRY_MAX = 30.0
+
+
+class PublishHandle(Future):
+    """單一消息的發布結果；result() 為 PUBLISHED / DROPPED / SPOOLED"""
+
+    def __init__(self, topic):
+        super().__init__()
+        self.topic = topic
+        self.mid = None
+        self.sent_at = None
+
+    @property
+    def published(self):
+        return self.done() and self.result() == PUBLISHED
+
+    def wait(self, timeout=None):
+        """等待確認，返回是否已發布 (逾時返回 False)"""
+        try:
+            return self.result(timeout) == PUBLISHED
+        except FutureTimeout:
+            return False
+
+
+def _resolved(topic, status):
+    handle = PublishHandle(topic)
+    handle.set_result(status)
+    return handle
+
+
+class DiskSpool:
+    """append-only 磁碟隊列，讀取位置保存在 <path>.offset 以便程序重啟後續傳
+
+    記錄格式: payload 長度 (I) | qos (B) | topic 長度 (H) | topic | payload
+    """
+
+    RECORD = struct.Struct('<IBH')
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + '.offset'
+        self.file = open(path, 'ab')
+        self.read_offset = 0
+        self._unsaved = 0
+
+        if os.path.exists(self.offset_path):
+            try:
+                with open(self.offset_path) as f:
+                    self.read_offset = min(int(f.read().strip() or 0), self.size)
+            except ValueError:
+                self.read_offset = 0
+
+    @property
+    def size(self):
+        return self.file.tell()
+
+    @property
+    def pending_bytes(self):
+        return self.size - self.read_offset
+
+    def append(self, topic, payload, qos):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        topic_bytes = topic.encode('utf-8')
+        self.file.write(self.RECORD.pack(len(payload), qos, len(topic_bytes)) + topic_bytes + payload)
+        self.file.flush()
+
+    def read_batch(self, limit):
+        """從目前讀取位置讀出最多 limit 筆，返回 [(topic, payload, qos, end_offset), ...]"""
+        records = []
+        end = self.size
+        with open(self.path, 'rb') as f:
+            f.seek(self.read_offset)
+            offset = self.read_offset
+            while len(records) < limit and offset + self.RECORD.size <= end:
+                length, qos, topic_length = self.RECORD.unpack(f.read(self.RECORD.size))
+                topic = f.read(topic_length).decode('utf-8')
+                payload = f.read(length)
+                offset += self.RECORD.size + topic_length + length
+                records.append((topic, payload, qos, offset))
+        return records
+
+    def commit(self, offset):
+        """推進讀取位置 (記錄已被 broker 確認)"""
+        self.read_offset = offset
+        self._unsaved += 1
+        if self._unsaved >= OFFSET_SAVE_EVERY:
+            self._save_offset()
+
+    def _save_offset(self):
+        self._unsaved = 0
+        with open(self.offset_path, 'w') as f:
+            f.write(str(self.read_offset))
+
+    def reset_if_drained(self):
+        """全部送出後清空檔案；返回是否已清空"""
+        if self.read_offset < self.size:
+            return False
+        self.file.truncate(0)
+        self.file.seek(0)
+        self.read_offset = 0
+        self._save_offset()
+        return True
+
+    def close(self):
+        self._save_offset()
+        self.file.close()
+
+
+class PublishPipeline:
+    """包裝 paho client 的發布管線"""
+
+    def __init__(self, client, max_in_flight=100, backpressure=BACKPRESSURE_BLOCK,
+                 block_timeout=5.0, spool_path=None, metrics=None):
+        if backpressure not in (BACKPRESSURE_BLOCK, BACKPRESSURE_DROP):
+            raise ValueError(f"unknown backpressure policy: {backpressure}")
+
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.spool = DiskSpool(spool_path) if spool_path else None
+        self.metrics = metrics
+        self.connected = False
+        self.connects = 0
+
+        self.lock = threading.Lock()
+        self.window = threading.Semaphore(max_in_flight)
+        self.in_flight = {}     # mid -> PublishHandle
+        self.acked = []         # on_publish 收到、尚未批次確認的 (mid, 確認時間)
+        self.unmatched = []     # 早於登記到達的確認，下一輪再配對
+        self.idle = threading.Condition(self.lock)
+        self.draining = False
+        self.closed = False
+        self.counters = {PUBLISHED: 0, DROPPED: 0, SPOOLED: 0, 'drained': 0}
+
+        client.max_inflight_messages_set(max_in_flight)
+        if metrics is not None:
+            metrics.attach(self)
+
+        self._ack_event = threading.Event()
+        self._confirmer = threading.Thread(target=self._confirm_loop, daemon=True)
+        self._confirmer.start()
+
+    # ==================== 發布 ====================
+
+    def submit(self, topic, payload, qos=1):
+        """送出一則消息，立即返回 PublishHandle"""
+        if self.spool:
+            with self.lock:
+                # 斷線或磁碟隊列尚未清空時寫入隊列，保持順序
+                if not self.connected or self.draining:
+                    self.spool.append(topic, payload, qos)
+                    self.counters[SPOOLED] += 1
+                    return _resolved(topic, SPOOLED)
+
+        return self._send(topic, payload, qos, self.backpressure)
+
+    def _send(self, topic, payload, qos, backpressure, from_spool=False):
+        if backpressure == BACKPRESSURE_DROP:
+            acquired = self.window.acquire(blocking=False)
+        else:
+            acquired = self.window.acquire(timeout=self.block_timeout)
+
+        if not acquired:
+            with self.lock:
+                self.counters[DROPPED] += 1
+            return _resolved(topic, DROPPED)
+
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+
+        # 不可持有 self.lock 呼叫 paho：paho 在持有內部鎖時呼叫 on_publish
+        handle = PublishHandle(topic)
+        handle.sent_at = time.monotonic()
+        info = self.client.publish(topic, payload, qos=qos)
+        handle.mid = info.mid
+
+        if info.rc == mqtt.MQTT_ERR_NO_CONN and qos == 0:
+            # paho 直接丟棄斷線時的 QoS 0 消息且不會呼叫 on_publish，視窗必須在此歸還
+            self.window.release()
+            status = DROPPED
+            with self.lock:
+                if self.spool and not from_spool:
+                    self.spool.append(topic, payload, qos)
+                    status = SPOOLED
+                self.counters[status] += 1
+            handle.set_result(status)
+            return handle
+
+        if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+            # 例如 paho 隊列已滿；MQTT_ERR_NO_CONN 的 QoS>0 消息仍會在重連後送出
+            self.window.release()
+            with self.lock:
+                self.counters[DROPPED] += 1
+            handle.set_result(DROPPED)
+            return handle
+
+        with self.lock:
+            self.in_flight[info.mid] = handle
+        if self.metrics is not None:
+            self.metrics.record_publish(topic, len(payload))
+        return handle
+
+    # ==================== paho 回呼 ====================
+
+    def on_publish(self, mid):
+        """paho on_publish：只記錄 mid 並釋放視窗，完成 handle 交給確認執行緒批次處理"""
+        acked_at = time.monotonic()
+        with self.lock:
+            self.acked.append((mid, acked_at))
+        self.window.release()
+        self._ack_event.set()
+
+    def on_connect(self):
+        if self.metrics is not None:
+            self.metrics.record_connect()
+        with self.lock:
+            self.connected = True
+            self.connects += 1
+            start_drain = bool(self.spool and self.spool.pending_bytes and not self.draining)
+            if start_drain:
+                self.draining = True
+        if start_drain:
+            threading.Thread(target=self._drain, daemon=True).start()
+
+    def on_disconnect(self):
+        if self.metrics is not None:
+            self.metrics.record_disconnect()
+        with self.lock:
+            self.connected = False
+
+    # ==================== 批次確認 ====================
+
+    def _confirm_loop(self):
+        while not self.closed:
+            self._ack_event.wait(CONFIRM_INTERVAL)
+            self._ack_event.clear()
+            self._confirm_batch()
+
+    def _confirm_batch(self):
+        with self.lock:
+            if not self.acked and not self.unmatched:
+                return
+            # 上一輪仍未配對的 mid 已非本管線的消息，直接丟棄
+            retry, self.unmatched = self.unmatched, []
+            acked, self.acked = self.acked, []
+
+            done = []
+            for mid, acked_at in retry:
+                handle = self.in_flight.pop(mid, None)
+                if handle is not None:
+                    done.append((handle, acked_at))
+            for mid, acked_at in acked:
+                handle = self.in_flight.pop(mid, None)
+                if handle is not None:
+                    done.append((handle, acked_at))
+                else:
+                    self.unmatched.append((mid, acked_at))
+            self.counters[PUBLISHED] += len(done)
+            if not self.in_flight:
+                self.idle.notify_all()
+
+        for handle, _ in done:
+            handle.set_result(PUBLISHED)
+        if self.metrics is not None:
+            self.metrics.record_acks([(handle.topic, acked_at - handle.sent_at)
+                                      for handle, acked_at in done])
+
+    # ==================== 磁碟隊列 ====================
+
+    def _drain(self):
+        """依序送出磁碟隊列中的消息，每則確認後才推進讀取位置
+
+        隊列清空前 draining 保持為 True，新消息繼續寫入隊列，不會超前較舊的消息；
+        連線期間送出失敗時退避後從讀取位置重送，只有斷線或關閉時才停止。
+        """
+        delay = DRAIN_RETRY_MIN
+        while True:
+            with self.lock:
+                if not self.connected or self.closed:
+                    self.draining = False
+                    return
+                batch = self.spool.read_batch(self.max_in_flight)
+                if not batch:
+                    self.spool.reset_if_drained()
+                    self.draining = False
+                    return
+
+            handles = [(self._send(topic, payload, qos, BACKPRESSURE_BLOCK, from_spool=True), end)
+                       for topic, payload, qos, end in batch]
+
+            failed = False
+            for handle, end in handles:
+                if not handle.wait(self.block_timeout):
+                    failed = True
+                    break
+                with self.lock:
+                    self.spool.commit(end)
+                    self.counters['drained'] += 1
+
+            if failed:
+                # 未確認：保留讀取位置 (至少一次)，斷線則等下次重連
+                with self.lock:
+                    if not self.connected or self.closed:
+                        self.draining = False
+                        return
+                time.sleep(delay)
+                delay = min(delay * 2, DRAIN_RETRY_MAX)
+            else:
+                delay = DRAIN_RETRY_MIN
+
+    # ==================== 狀態與關閉 ====================
+
+    @property
+    def depth(self):
+        """目前在途消息數"""
+        with self.lock:
+            return len(self.in_flight)
+
+    @property
+    def spool_bytes(self):
+        if not self.spool:
+            return 0
+        with self.lock:
+            return self.spool.pending_bytes
+
+    def flush(self, timeout=None):
+        """等待所有在途消息確認，返回是否全部完成"""
+        with self.lock:
+            return self.idle.wait_for(lambda: not self.in_flight, timeout)
+
+    def close(self):
+        self.closed = True
+        self._ack_event.set()
+        if self.spool:
+            with self.lock:
+                self.spool.close()
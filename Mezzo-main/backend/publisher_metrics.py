@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""發布端指標：每個主題的消息數 / 位元組數、發布到確認的延遲直方圖、重連次數與隊列深度
+
+由 PublishPipeline 在送出、批次確認與連線事件時更新；MetricsServer 以 Prometheus
+文字格式提供 /metrics，SummaryReporter 定期以 logging 輸出一行摘要。
+
+用法:
+    python mqtt_publish.py simulate --metrics-port 9108 --metrics-interval 30
+    curl http://localhost:9108/metrics
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('mqtt_publish')
+
+# 延遲直方圖上界 (秒)
+ACK_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+DEFAULT_METRICS_PORT = 9108
+
+# device/<id>/... 合併為 device/+/...，避免每個設備產生一組時間序列
+_DEVICE_SEGMENT = re.compile(r'(^|/)device/[^/]+/')
+
+
+def topic_label(topic):
+    return _DEVICE_SEGMENT.sub(r'\1device/+/', topic)
+
+
+class Histogram:
+    """固定上界的累積直方圖 (Prometheus histogram)"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(ACK_LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(ACK_LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """以所在桶的上界估計分位數；超過最大上界時返回 inf"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return ACK_LATENCY_BUCKETS[i] if i < len(ACK_LATENCY_BUCKETS) else float('inf')
+        return float('inf')
+
+
+class PublisherMetrics:
+    """單一或多條連線共用的指標；佇列深度等即時值在輸出時向各 pipeline 讀取"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.topics = {}        # label -> [messages, bytes]
+        self.ack_latency = {}   # label -> Histogram
+        self.connects = 0
+        self.disconnects = 0
+        self.pipelines = []
+        self._labels = {}
+
+    def attach(self, pipeline):
+        self.pipelines.append(pipeline)
+
+    def detach(self, pipeline):
+        """移除不再使用的 pipeline (例如連線失敗而被捨棄)"""
+        if pipeline in self.pipelines:
+            self.pipelines.remove(pipeline)
+
+    def _label(self, topic):
+        label = self._labels.get(topic)
+        if label is None:
+            label = self._labels[topic] = topic_label(topic)
+        return label
+
+    # ==================== 由 PublishPipeline 呼叫 ====================
+
+    def record_publish(self, topic, size):
+        label = self._label(topic)
+        with self.lock:
+            counter = self.topics.get(label)
+            if counter is None:
+                counter = self.topics[label] = [0, 0]
+            counter[0] += 1
+            counter[1] += size
+
+    def record_acks(self, samples):
+        """批次記錄 [(topic, 延遲秒), ...]"""
+        if not samples:
+            return
+        with self.lock:
+            for topic, latency in samples:
+                label = self._label(topic)
+                histogram = self.ack_latency.get(label)
+                if histogram is None:
+                    histogram = self.ack_latency[label] = Histogram()
+                histogram.observe(latency)
+
+    def record_connect(self):
+        with self.lock:
+            self.connects += 1
+
+    def record_disconnect(self):
+        with self.lock:
+            self.disconnects += 1
+
+    # ==================== 讀取 ====================
+
+    @property
+    def reconnects(self):
+        # 每條連線的第一次連線不算重連；從未連上的連線不影響其他連線的計數
+        return sum(max(0, pipeline.connects - 1) for pipeline in self.pipelines)
+
+    def gauges(self):
+        """各 pipeline 的即時值總和"""
+        totals = {'in_flight': 0, 'spool_bytes': 0, 'dropped': 0, 'spooled': 0}
+        for pipeline in self.pipelines:
+            totals['in_flight'] += pipeline.depth
+            totals['spool_bytes'] += pipeline.spool_bytes
+            totals['dropped'] += pipeline.counters['dropped']
+            totals['spooled'] += pipeline.counters['spooled']
+        return totals
+
+    def totals(self):
+        """返回 (消息數, 位元組數, 合併後的延遲直方圖)"""
+        histogram = Histogram()
+        with self.lock:
+            messages = sum(c[0] for c in self.topics.values())
+            size = sum(c[1] for c in self.topics.values())
+            for h in self.ack_latency.values():
+                histogram.merge(h)
+        return messages, size, histogram
+
+    def render(self):
+        """Prometheus 文字格式 (0.0.4)"""
+        with self.lock:
+            topics = {label: list(c) for label, c in self.topics.items()}
+            latency = {label: (list(h.counts), h.sum, h.count) for label, h in self.ack_latency.items()}
+            connects, disconnects = self.connects, self.disconnects
+        gauges = self.gauges()
+        reconnects = self.reconnects
+
+        lines = [
+            '# HELP mqtt_publish_messages_total Messages handed to the MQTT client.',
+            '# TYPE mqtt_publish_messages_total counter',
+        ]
+        for label, (messages, _) in sorted(topics.items()):
+            lines.append(f'mqtt_publish_messages_total{{topic="{label}"}} {messages}')
+        lines += [
+            '# HELP mqtt_publish_bytes_total Payload bytes handed to the MQTT client.',
+            '# TYPE mqtt_publish_bytes_total counter',
+        ]
+        for label, (_, size) in sorted(topics.items()):
+            lines.append(f'mqtt_publish_bytes_total{{topic="{label}"}} {size}')
+
+        lines += [
+            '# HELP mqtt_publish_ack_latency_seconds Time from publish() to on_publish (PUBACK for QoS 1).',
+            '# TYPE mqtt_publish_ack_latency_seconds histogram',
+        ]
+        for label, (counts, total, count) in sorted(latency.items()):
+            cumulative = 0
+            for bound, n in zip(ACK_LATENCY_BUCKETS, counts):
+                cumulative += n
+                lines.append(f'mqtt_publish_ack_latency_seconds_bucket{{topic="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'mqtt_publish_ack_latency_seconds_bucket{{topic="{label}",le="+Inf"}} {count}')
+            lines.append(f'mqtt_publish_ack_latency_seconds_sum{{topic="{label}"}} {total:.6f}')
+            lines.append(f'mqtt_publish_ack_latency_seconds_count{{topic="{label}"}} {count}')
+
+        lines += [
+            '# HELP mqtt_publish_connects_total Successful broker connections.',
+            '# TYPE mqtt_publish_connects_total counter',
+            f'mqtt_publish_connects_total {connects}',
+            '# HELP mqtt_publish_reconnects_total Connections after the first one on each connection.',
+            '# TYPE mqtt_publish_reconnects_total counter',
+            f'mqtt_publish_reconnects_total {reconnects}',
+            '# HELP mqtt_publish_disconnects_total Broker disconnections.',
+            '# TYPE mqtt_publish_disconnects_total counter',
+            f'mqtt_publish_disconnects_total {disconnects}',
+            '# HELP mqtt_publish_in_flight Messages waiting for broker acknowledgement.',
+            '# TYPE mqtt_publish_in_flight gauge',
+            f'mqtt_publish_in_flight {gauges["in_flight"]}',
+            '# HELP mqtt_publish_spool_bytes Bytes waiting in the disk spool.',
+            '# TYPE mqtt_publish_spool_bytes gauge',
+            f'mqtt_publish_spool_bytes {gauges["spool_bytes"]}',
+            '# HELP mqtt_publish_dropped_total Messages dropped by backpressure.',
+            '# TYPE mqtt_publish_dropped_total counter',
+            f'mqtt_publish_dropped_total {gauges["dropped"]}',
+            '# HELP mqtt_publish_spooled_total Messages written to the disk spool.',
+            '# TYPE mqtt_publish_spooled_total counter',
+            f'mqtt_publish_spooled_total {gauges["spooled"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+# ==================== 輸出 ====================
+
+class MetricsServer:
+    """在背景執行緒提供 GET /metrics"""
+
+    def __init__(self, metrics, port=DEFAULT_METRICS_PORT, host='0.0.0.0'):
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics %s", format % args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"📈 Metrics available at http://localhost:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SummaryReporter:
+    """每 interval 秒以 INFO 等級輸出一行摘要"""
+
+    def __init__(self, metrics, interval=60.0):
+        self.metrics = metrics
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self._last = (time.monotonic(), 0, 0)
+
+    def summary_line(self):
+        messages, size, histogram = self.metrics.totals()
+        gauges = self.metrics.gauges()
+        now = time.monotonic()
+        last_time, last_messages, last_size = self._last
+        elapsed = max(now - last_time, 1e-9)
+        self._last = (now, messages, size)
+        return (
+            f"📈 {messages} msgs ({(messages - last_messages) / elapsed:.1f}/s), "
+            f"{size} bytes ({(size - last_size) / elapsed:.0f} B/s), "
+            f"ack p50 {histogram.quantile(0.5) * 1000:g} ms p99 {histogram.quantile(0.99) * 1000:g} ms, "
+            f"in-flight {gauges['in_flight']}, spool {gauges['spool_bytes']} B, "
+            f"dropped {gauges['dropped']}, reconnects {self.metrics.reconnects}"
+        )
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            logger.info(self.summary_line())
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""位置回報策略：dead-band 與自適應回報頻率
+
+只有在設備移動超過距離門檻、航向或速度變化足夠、或超過最長靜默時間 (心跳)
+時才回報位置；狀態未變化時不重複發布。
+"""
+import math
+import time
+
+EARTH_RADIUS = 6371000.0  # 公尺
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """兩點間的大圓距離 (公尺)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """由點 1 指向點 2 的方位角 (度，0-360)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlambda = math.radians(lon2 - lon1)
+    x = math.sin(dlambda) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def heading_delta(a, b):
+    """兩個航向的最小夾角 (度)"""
+    diff = abs(a - b) % 360
+    return min(diff, 360 - diff)
+
+
+class DeviceReportState:
+    """單一設備的回報狀態"""
+
+    __slots__ = ('last_lat', 'last_lon', 'last_time', 'heading', 'speed',
+                 'sent_lat', 'sent_lon', 'sent_time', 'sent_heading', 'sent_speed',
+                 'status', 'status_time', 'suppressed')
+
+    def __init__(self):
+        self.last_lat = self.last_lon = self.last_time = None
+        self.heading = self.speed = None
+        self.sent_lat = self.sent_lon = self.sent_time = None
+        self.sent_heading = self.sent_speed = None
+        self.status = None
+        self.status_time = None
+        self.suppressed = 0
+
+
+class ReportingPolicy:
+    """決定每則位置 / 狀態更新是否需要發布"""
+
+    def __init__(self, min_distance=10.0, heading_threshold=30.0, speed_threshold=2.0,
+                 min_speed=0.5, max_silence=60.0, battery_delta=5, signal_delta=15,
+                 noise_floor=3.0):
+        self.min_distance = min_distance            # 公尺
+        self.heading_threshold = heading_threshold  # 度
+        self.speed_threshold = speed_threshold      # 公尺/秒
+        self.min_speed = min_speed                  # 低於此速度不比較航向 (公尺/秒)
+        self.max_silence = max_silence              # 心跳間隔 (秒)
+        self.battery_delta = battery_delta          # 電量變化門檻 (%)
+        self.signal_delta = signal_delta            # 信號變化門檻
+        self.noise_floor = noise_floor              # 低於此位移視為 GPS 雜訊 (公尺)
+        self.devices = {}
+        self.counters = {
+            'position_sent': 0,
+            'position_suppressed': 0,
+            'status_sent': 0,
+            'status_suppressed': 0
+        }
+
+    def _state(self, device_id):
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = DeviceReportState()
+        return state
+
+    def should_report_position(self, device_id, lat, lon, now=None):
+        """判斷是否回報位置，並更新設備狀態"""
+        if now is None:
+            now = time.monotonic()
+        state = self._state(device_id)
+
+        # 由上一次觀測到的位置估算目前的航向與速度
+        if state.last_time is not None and now > state.last_time:
+            moved = haversine(state.last_lat, state.last_lon, lat, lon)
+            if moved < self.noise_floor:
+                # 靜止設備的 GPS 抖動不應被當成速度或航向變化
+                state.speed = 0.0
+            else:
+                state.speed = moved / (now - state.last_time)
+                state.heading = bearing(state.last_lat, state.last_lon, lat, lon)
+        state.last_lat, state.last_lon, state.last_time = lat, lon, now
+
+        # 首次回報時還沒有速度 / 航向，以第一次估算值作為基準，避免每個設備啟動時都連發兩次
+        if state.sent_time is not None and state.sent_speed is None:
+            state.sent_speed, state.sent_heading = state.speed, state.heading
+
+        if self._position_changed(state, lat, lon, now):
+            state.sent_lat, state.sent_lon, state.sent_time = lat, lon, now
+            state.sent_heading, state.sent_speed = state.heading, state.speed
+            self.counters['position_sent'] += 1
+            return True
+
+        state.suppressed += 1
+        self.counters['position_suppressed'] += 1
+        return False
+
+    def _position_changed(self, state, lat, lon, now):
+        if state.sent_time is None:
+            return True
+        if now - state.sent_time >= self.max_silence:
+            return True
+        if haversine(state.sent_lat, state.sent_lon, lat, lon) >= self.min_distance:
+            return True
+
+        if state.speed is not None:
+            if state.sent_speed is None or abs(state.speed - state.sent_speed) >= self.speed_threshold:
+                return True
+            if (state.speed >= self.min_speed and state.heading is not None and
+                    (state.sent_heading is None or
+                     heading_delta(state.heading, state.sent_heading) >= self.heading_threshold)):
+                return True
+        return False
+
+    def should_report_status(self, device_id, status, battery=None, signal=None, now=None):
+        """判斷狀態是否有變化 (或已達心跳時間)"""
+        if now is None:
+            now = time.monotonic()
+        state = self._state(device_id)
+        previous = state.status
+
+        changed = (
+            previous is None or
+            now - state.status_time >= self.max_silence or
+            status != previous[0] or
+            _exceeds(battery, previous[1], self.battery_delta) or
+            _exceeds(signal, previous[2], self.signal_delta)
+        )
+
+        if changed:
+            state.status = (status, battery, signal)
+            state.status_time = now
+            self.counters['status_sent'] += 1
+            return True
+
+        state.suppressed += 1
+        self.counters['status_suppressed'] += 1
+        return False
+
+    def summary(self):
+        """返回計數器與整體抑制比例"""
+        counters = dict(self.counters)
+        total = sum(counters.values())
+        suppressed = counters['position_suppressed'] + counters['status_suppressed']
+        counters['suppression_ratio'] = round(suppressed / total, 3) if total else 0.0
+        return counters
+
+
+def _exceeds(value, previous, delta):
+    if value is None and previous is None:
+        return False
+    if value is None or previous is None:
+        return True
+    return abs(value - previous) >= delta
@@ -1,6 +1,6 @@
 const express = require('express');
 const cors = require('cors');
-const { exec, spawn } = require('child_process');
+const { spawn } = require('child_process');
 const mqtt = require('mqtt');
 const WebSocket = require('ws');
 const xml2js = require('xml2js');
@@ -38,7 +38,9 @@ const MQTT_CONFIG = {
     CAMERA_STATUS: 'myapp/camera/status',
     CAMERA_GPS: 'myapp/camera/gps',
     COT_MESSAGE: 'myapp/cot/message',
+    COT_PROTO: 'myapp/cot/proto',
     DEVICE_STATUS: 'myapp/device/+/status',
+    DEVICE_BUNDLE: 'myapp/fleet/bundle',
     STREAM_CONTROL: 'myapp/stream/control',
     // ===== 訊息主題 =====
     MESSAGE_BROADCAST: 'myapp/messages/broadcast',
@@ -53,6 +55,15 @@ const MQTT_CONFIG = {
   }
 };
 
+// Python 發布常駐程序配置 (mqtt_publish.py serve)
+const PUBLISHER_CONFIG = {
+  enabled: true,
+  python: 'python',
+  script: path.join(__dirname, 'mqtt_publish.py'),
+  ackTimeout: 6000,
+  restartDelay: 5000
+};
+
 // RTSP/影像配置
 const STREAM_CONFIG = {
   enabled: true,
@@ -69,6 +80,26 @@ const STREAM_CONFIG = {
   streamTimeout: 300000  // 5 分鐘無活動自動停止
 };
 
+// CoT XML 解析器：共用單一實例 (parseString 為同步且完成後自動 reset)
+const COT_XML_OPTIONS = {
+  explicitArray: false,
+  mergeAttrs: false,
+  trim: true,
+  normalize: true,
+  normalizeTags: false
+};
+let cotXmlParser = new xml2js.Parser(COT_XML_OPTIONS);
+
+function parseCotXml(xml, callback) {
+  cotXmlParser.parseString(xml, (err, result) => {
+    if (err) {
+      // 錯誤時 reset() 在舊的 sax 解析器仍執行中呼叫，錯誤狀態可能殘留給下一則消息，改用新的解析器
+      cotXmlParser = new xml2js.Parser(COT_XML_OPTIONS);
+    }
+    callback(err, result);
+  });
+}
+
 // ==================== 儲存 ====================
 
 const connectedDevices = new Map();
@@ -242,15 +273,7 @@ class TAKClient {
         return;
       }
 
-      const parser = new xml2js.Parser({
-        explicitArray: false,
-        mergeAttrs: false,
-        trim: true,
-        normalize: true,
-        normalizeTags: false
-      });
-
-      parser.parseString(cleanedMessage, (err, result) => {
+      parseCotXml(cleanedMessage, (err, result) => {
         if (err) {
           console.error('❌ TAK message parse error:', err.message);
           return;
@@ -568,6 +591,16 @@ mqttClient.on('connect', () => {
 });
 
 mqttClient.on('message', (topic, message) => {
+  // 二進位 bundle 不轉字串、不轉發原始內容
+  if (topic === MQTT_CONFIG.topics.DEVICE_BUNDLE) {
+    handleDeviceBundle(message);
+    return;
+  }
+  if (topic === MQTT_CONFIG.topics.COT_PROTO) {
+    handleCotProto(message);
+    return;
+  }
+
   const messageStr = message.toString();
   console.log(`📨 MQTT [${topic}]:`, messageStr.substring(0, 100));
 
@@ -610,6 +643,114 @@ mqttClient.on('offline', () => {
   console.warn('⚠️  MQTT offline');
 });
 
+// ==================== Python 發布常駐程序 ====================
+
+class PublisherDaemon {
+  constructor(config) {
+    this.config = config;
+    this.process = null;
+    this.buffer = '';
+    this.nextId = 1;
+    this.pending = new Map();  // id -> { resolve, timer }
+    this.stopped = false;
+  }
+
+  start() {
+    this.stopped = false;
+    this.process = spawn(this.config.python, [this.config.script, 'serve'], {
+      cwd: __dirname,
+      stdio: ['pipe', 'pipe', 'inherit']
+    });
+
+    this.process.stdout.on('data', (data) => {
+      this.buffer += data.toString();
+      let newline;
+      while ((newline = this.buffer.indexOf('\n')) >= 0) {
+        const line = this.buffer.slice(0, newline).trim();
+        this.buffer = this.buffer.slice(newline + 1);
+        if (line) this.handleAck(line);
+      }
+    });
+
+    this.process.on('error', (error) => {
+      console.error('❌ Publisher daemon error:', error.message);
+    });
+
+    // 常駐程序已結束但 'close' 尚未觸發時寫入會得到 EPIPE，不可讓它變成未處理的例外
+    this.process.stdin.on('error', (error) => {
+      console.error('❌ Publisher daemon stdin error:', error.message);
+      this.rejectAll(`publisher daemon stdin error: ${error.message}`);
+    });
+
+    this.process.on('close', (code) => {
+      console.warn(`⚠️  Publisher daemon exited (code: ${code})`);
+      this.process = null;
+      this.buffer = '';
+      this.rejectAll('publisher daemon exited');
+      if (!this.stopped) {
+        setTimeout(() => this.start(), this.config.restartDelay);
+      }
+    });
+  }
+
+  handleAck(line) {
+    let ack;
+    try {
+      ack = JSON.parse(line);
+    } catch (error) {
+      console.error('❌ Invalid publisher ack:', line);
+      return;
+    }
+
+    const entry = this.pending.get(ack.id);
+    if (!entry) return;
+    clearTimeout(entry.timer);
+    this.pending.delete(ack.id);
+    entry.resolve(ack);
+  }
+
+  send(command, fields = {}) {
+    return new Promise((resolve) => {
+      const id = this.nextId++;
+
+      if (!this.process || !this.process.stdin.writable) {
+        resolve({ id, command, ok: false, error: 'publisher daemon not running' });
+        return;
+      }
+
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        resolve({ id, command, ok: false, error: 'ack timeout' });
+      }, this.config.ackTimeout);
+
+      this.pending.set(id, { resolve, timer });
+      this.process.stdin.write(JSON.stringify({ id, command, ...fields }) + '\n');
+    });
+  }
+
+  rejectAll(reason) {
+    this.pending.forEach(({ resolve, timer }, id) => {
+      clearTimeout(timer);
+      resolve({ id, ok: false, error: reason });
+    });
+    this.pending.clear();
+  }
+
+  stop() {
+    this.stopped = true;
+    if (this.process) {
+      this.process.stdin.end();
+      this.process.kill();
+    }
+  }
+}
+
+let publisherDaemon = null;
+if (PUBLISHER_CONFIG.enabled) {
+  publisherDaemon = new PublisherDaemon(PUBLISHER_CONFIG);
+  publisherDaemon.start();
+}
+
 // ==================== WebSocket Server ====================
 
 const wss = new WebSocket.Server({ port: WS_PORT });
@@ -754,15 +895,7 @@ function handleCotMessage(message) {
     return;
   }
 
-  const parser = new xml2js.Parser({
-    explicitArray: false,
-    mergeAttrs: false,
-    trim: true,
-    normalize: true,
-    normalizeTags: false
-  });
-
-  parser.parseString(cleanedMessage, (err, result) => {
+  parseCotXml(cleanedMessage, (err, result) => {
     if (err) {
       try {
         const jsonData = JSON.parse(message);
@@ -777,6 +910,125 @@ function handleCotMessage(message) {
   });
 }
 
+// ===== TAK Protocol v1 protobuf (格式見 cot_encoder.py) =====
+
+const TAK_MESH_HEADER = Buffer.from([0xbf, 0x01, 0xbf]);
+
+const TAK_EVENT_FIELDS = {
+  1: 'type', 5: 'uid', 6: 'sendTime', 7: 'startTime', 8: 'staleTime', 9: 'how',
+  10: 'lat', 11: 'lon', 12: 'hae', 13: 'ce', 14: 'le'
+};
+
+const XML_ENTITIES = { '&lt;': '<', '&gt;': '>', '&amp;': '&', '&quot;': '"', '&apos;': "'" };
+
+function unescapeXml(text) {
+  return text.replace(/&(?:lt|gt|amp|quot|apos);/g, entity => XML_ENTITIES[entity]);
+}
+
+function readVarint(buffer, offset) {
+  // sendTime 等毫秒時間戳超過 32 位元，不能用位元運算
+  let result = 0;
+  let scale = 1;
+  for (;;) {
+    if (offset >= buffer.length) {
+      throw new Error('truncated varint');
+    }
+    const byte = buffer[offset++];
+    result += (byte & 0x7f) * scale;
+    if (!(byte & 0x80)) {
+      return [result, offset];
+    }
+    scale *= 128;
+  }
+}
+
+function* protoFields(buffer) {
+  let offset = 0;
+  while (offset < buffer.length) {
+    let key, value;
+    [key, offset] = readVarint(buffer, offset);
+    const field = Math.floor(key / 8);
+    const wireType = key & 7;
+    if (wireType === 0) {
+      [value, offset] = readVarint(buffer, offset);
+    } else if (wireType === 1) {
+      value = buffer.readDoubleLE(offset);
+      offset += 8;
+    } else if (wireType === 2) {
+      let length;
+      [length, offset] = readVarint(buffer, offset);
+      if (offset + length > buffer.length) {
+        throw new Error('truncated field');
+      }
+      value = buffer.subarray(offset, offset + length);
+      offset += length;
+    } else if (wireType === 5) {
+      value = buffer.subarray(offset, offset + 4);
+      offset += 4;
+    } else {
+      throw new Error(`unsupported wire type ${wireType}`);
+    }
+    yield [field, value];
+  }
+}
+
+function decodeTakProto(buffer) {
+  if (buffer.length >= 3 && buffer.subarray(0, 3).equals(TAK_MESH_HEADER)) {
+    buffer = buffer.subarray(3);
+  }
+
+  let event = null;
+  for (const [field, value] of protoFields(buffer)) {
+    if (field === 2) {
+      event = {};
+      for (const [eventField, eventValue] of protoFields(value)) {
+        const name = TAK_EVENT_FIELDS[eventField];
+        if (name) {
+          event[name] = Buffer.isBuffer(eventValue) ? eventValue.toString('utf8') : eventValue;
+        } else if (eventField === 15) {
+          for (const [detailField, detailValue] of protoFields(eventValue)) {
+            if (detailField === 1) {
+              const remarks = /<remarks>([\s\S]*)<\/remarks>/.exec(detailValue.toString('utf8'));
+              if (remarks) {
+                event.remarks = unescapeXml(remarks[1]);
+              }
+            } else if (detailField === 2) {
+              for (const [f, v] of protoFields(detailValue)) {
+                if (f === 2) event.callsign = v.toString('utf8');
+              }
+            } else if (detailField === 5) {
+              for (const [f, v] of protoFields(detailValue)) {
+                if (f === 1) event.battery = v;
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+
+  if (!event) {
+    throw new Error('no cotEvent in TakMessage');
+  }
+
+  // 與 XML 事件相同的 point 結構，供 updateDevicePosition 使用
+  event.point = { lat: event.lat, lon: event.lon, hae: event.hae, ce: event.ce, le: event.le };
+  delete event.lat;
+  delete event.lon;
+  delete event.hae;
+  delete event.ce;
+  delete event.le;
+  return event;
+}
+
+function handleCotProto(message) {
+  try {
+    processCotData(decodeTakProto(message));
+  } catch (error) {
+    console.error('❌ CoT proto error:', error.message);
+  }
+}
+
 function processCotData(cotData) {
   try {
     const cotMessage = {
@@ -805,50 +1057,111 @@ function processCotData(cotData) {
 
 function handleGpsUpdate(message) {
   try {
-    const gpsData = JSON.parse(message);
+    applyGpsUpdate(JSON.parse(message));
+  } catch (error) {
+    console.error('❌ GPS update error:', error);
+  }
+}
 
-    const lat = parseFloat(gpsData.latitude);
-    const lng = parseFloat(gpsData.longitude);
+function applyGpsUpdate(gpsData) {
+  const lat = parseFloat(gpsData.latitude);
+  const lng = parseFloat(gpsData.longitude);
 
-    if (isNaN(lat) || isNaN(lng)) {
-      console.warn('⚠️  Invalid GPS data');
-      return;
-    }
+  if (isNaN(lat) || isNaN(lng)) {
+    console.warn('⚠️  Invalid GPS data');
+    return;
+  }
 
-    const deviceId = gpsData.deviceId || 'unknown';
-    const existingDevice = connectedDevices.get(deviceId) || {};
+  const deviceId = gpsData.deviceId || 'unknown';
+  const existingDevice = connectedDevices.get(deviceId) || {};
 
-    const device = {
-      ...existingDevice,
-      id: deviceId,
-      type: existingDevice.type || gpsData.type || 'mobile',
-      position: {
-        lat: lat,
-        lng: lng,
-        alt: parseFloat(gpsData.altitude) || 0
-      },
-      callsign: gpsData.callsign || existingDevice.callsign || deviceId,
-      group: gpsData.group || existingDevice.group || '未分組',
-      lastUpdate: new Date().toISOString(),
-      status: 'active'
-    };
+  const device = {
+    ...existingDevice,
+    id: deviceId,
+    type: existingDevice.type || gpsData.type || 'mobile',
+    position: {
+      lat: lat,
+      lng: lng,
+      alt: parseFloat(gpsData.altitude) || 0
+    },
+    callsign: gpsData.callsign || existingDevice.callsign || deviceId,
+    group: gpsData.group || existingDevice.group || '未分組',
+    lastUpdate: new Date().toISOString(),
+    status: gpsData.status || 'active'
+  };
 
-    connectedDevices.set(deviceId, device);
-    updateGroupIndex(deviceId, device.group);
+  if (gpsData.battery !== undefined) device.battery = gpsData.battery;
+  if (gpsData.signal !== undefined) device.signal = gpsData.signal;
 
-    console.log(`📍 GPS updated for ${deviceId}: ${lat.toFixed(6)}, ${lng.toFixed(6)}`);
+  connectedDevices.set(deviceId, device);
+  updateGroupIndex(deviceId, device.group);
 
-    if (takClient && TAK_CONFIG.enabled) {
-      const cotXml = generateDeviceCoT(device);
-      takClient.sendCoT(cotXml);
-    }
+  console.log(`📍 GPS updated for ${deviceId}: ${lat.toFixed(6)}, ${lng.toFixed(6)}`);
 
-    broadcastToClients({
-      type: 'device_update',
-      device: device
+  if (takClient && TAK_CONFIG.enabled) {
+    const cotXml = generateDeviceCoT(device);
+    takClient.sendCoT(cotXml);
+  }
+
+  broadcastToClients({
+    type: 'device_update',
+    device: device
+  });
+}
+
+// ===== 設備 bundle (二進位，格式見 bundle_codec.py) =====
+
+const BUNDLE_MAGIC = 'MB';
+const BUNDLE_VERSION = 1;
+const BUNDLE_HEADER_SIZE = 14;
+const BUNDLE_RECORD_SIZE = 13;
+const BUNDLE_UNKNOWN = 255;
+const BUNDLE_STATUS_NAMES = ['active', 'warning', 'inactive', 'offline'];
+
+function decodeBundle(buffer) {
+  if (buffer.length < BUNDLE_HEADER_SIZE || buffer.toString('latin1', 0, 2) !== BUNDLE_MAGIC) {
+    throw new Error('not a device bundle');
+  }
+
+  const version = buffer.readUInt8(2);
+  if (version !== BUNDLE_VERSION) {
+    throw new Error(`unsupported bundle version ${version}`);
+  }
+
+  const count = buffer.readUInt16LE(4);
+  const timestamp = Number(buffer.readBigUInt64LE(6));
+  const records = [];
+  let offset = BUNDLE_HEADER_SIZE;
+
+  for (let i = 0; i < count; i++) {
+    const idLength = buffer.readUInt8(offset);
+    offset += 1;
+    const deviceId = buffer.toString('utf8', offset, offset + idLength);
+    offset += idLength;
+
+    const battery = buffer.readUInt8(offset + 10);
+    const signal = buffer.readUInt8(offset + 11);
+    records.push({
+      deviceId: deviceId,
+      latitude: buffer.readInt32LE(offset) / 1e7,
+      longitude: buffer.readInt32LE(offset + 4) / 1e7,
+      altitude: buffer.readInt16LE(offset + 8) / 10,
+      battery: battery === BUNDLE_UNKNOWN ? undefined : battery,
+      signal: signal === BUNDLE_UNKNOWN ? undefined : signal,
+      status: BUNDLE_STATUS_NAMES[buffer.readUInt8(offset + 12)] || 'unknown'
     });
+    offset += BUNDLE_RECORD_SIZE;
+  }
+
+  return { timestamp, records };
+}
+
+function handleDeviceBundle(message) {
+  try {
+    const bundle = decodeBundle(message);
+    bundle.records.forEach(record => applyGpsUpdate(record));
   } catch (error) {
-    console.error('❌ GPS update error:', error);
+    console.error('❌ Device bundle error:', error.message);
   }
 }
 
@@ -1430,7 +1743,7 @@ app.get('/messages', (req, res) => {
   });
 });
 
-app.post('/voice-message', (req, res) => {
+app.post('/voice-message', async (req, res) => {
   const { message } = req.body;
   console.log('🎤 Voice command:', message);
 
@@ -1454,17 +1767,21 @@ app.post('/voice-message', (req, res) => {
       timestamp: new Date().toISOString()
     }));
 
-    try {
-      exec(`python mqtt_publish.py ${command}`);
-    } catch (error) {
-      console.error('Python script error:', error);
+  }
+
+  let ack = null;
+  if (command && publisherDaemon) {
+    ack = await publisherDaemon.send(command);
+    if (!ack.ok) {
+      console.error('❌ Publisher daemon error:', ack.error);
     }
   }
 
   res.json({
     success: true,
     command: command,
-    originalMessage: message
+    originalMessage: message,
+    published: ack ? ack.ok : null
   });
 });
 
@@ -1523,6 +1840,11 @@ function shutdown() {
     console.log('✅ WebSocket server closed');
   });
 
+  if (publisherDaemon) {
+    publisherDaemon.stop();
+    console.log('✅ Publisher daemon stopped');
+  }
+
   mqttClient.end(false, () => {
     console.log('✅ MQTT client disconnected');
   });
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""MQTT 流量錄製與時間縮放重播
+
+record-traffic 訂閱應用主題，把每則消息 (主題、QoS、到達時間、內容) 附加到分段日誌檔；
+replay-traffic 以記憶體映射逐段讀取，依原速、N 倍速或最快速度重新發布，
+可依設備或主題過濾，並可改寫設備 ID 把一份錄製放大成更大的車隊。
+
+分段檔格式:
+    header : magic "MZLOG" (5s) | version (B)
+    record : 到達時間 µs (Q) | qos (B) | topic 長度 (H) | payload 長度 (I) | topic | payload
+
+用法:
+    python mqtt_publish.py record-traffic --log-dir captures/run1 --duration 600
+    python mqtt_publish.py replay-traffic --log-dir captures/run1 --speed 10 --multiply 5
+"""
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from bundle_codec import decode_bundle, encode_bundle
+from mqtt_publish import TOPIC_BUNDLE
+
+logger = logging.getLogger('mqtt_publish')
+
+LOG_MAGIC = b'MZLOG'
+LOG_VERSION = 1
+_FILE_HEADER = struct.Struct('<5sB')
+_RECORD = struct.Struct('<QBHI')
+
+SEGMENT_PATTERN = 'segment-{:06d}.mzlog'
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+RECORD_TOPICS = ['camera/gps', 'device/+/status', 'cot/message', 'cot/proto',
+                 TOPIC_BUNDLE, 'messages/#']
+
+# 損壞或無法解析的 payload：該筆記錄計入統計，不中止重播
+_MALFORMED = (ValueError, TypeError, struct.error, IndexError)
+
+_DEVICE_TOPIC = re.compile(r'^device/([^/]+)/')
+_COT_UID = re.compile(r'uid="([^"]*)"')
+
+
+def topic_matches(pattern, topic):
+    """MQTT 主題萬用字元 (+ / #) 比對"""
+    pattern_levels = pattern.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(pattern_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[i]:
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+# ==================== 寫入 ====================
+
+class SegmentWriter:
+    """append-only 分段日誌，超過 segment_size 時換新檔
+
+    每個目錄只存一次錄製：重播依到達時間排程，接續舊錄製會把兩次錄製之間的空檔也重播出來。
+    """
+
+    def __init__(self, log_dir, segment_size=DEFAULT_SEGMENT_SIZE):
+        os.makedirs(log_dir, exist_ok=True)
+        if list_segments(log_dir):
+            raise FileExistsError(f"{log_dir} already contains a recording; choose an empty --log-dir")
+        self.log_dir = log_dir
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.file = None
+        self.index = 0
+        self.records = 0
+        self.bytes = 0
+        self._open_segment()
+
+    def _open_segment(self):
+        if self.file:
+            self.file.close()
+        path = os.path.join(self.log_dir, SEGMENT_PATTERN.format(self.index))
+        self.file = open(path, 'wb')
+        self.file.write(_FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+        self.index += 1
+
+    def append(self, topic, payload, qos, arrival=None):
+        if arrival is None:
+            arrival = time.time()
+        topic_bytes = topic.encode('utf-8')
+        record = _RECORD.pack(int(arrival * 1_000_000), qos, len(topic_bytes), len(payload))
+
+        with self.lock:
+            if self.file.tell() + len(record) + len(topic_bytes) + len(payload) > self.segment_size:
+                self._open_segment()
+            self.file.write(record)
+            self.file.write(topic_bytes)
+            self.file.write(payload)
+            self.records += 1
+            self.bytes += len(payload)
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+class TrafficRecorder:
+    """訂閱應用主題並寫入分段日誌"""
+
+    def __init__(self, broker, port, log_dir, topic_prefix="", topics=RECORD_TOPICS,
+                 segment_size=DEFAULT_SEGMENT_SIZE):
+        self.broker = broker
+        self.port = port
+        self.topic_prefix = topic_prefix
+        self.topics = topics
+        self.writer = SegmentWriter(log_dir, segment_size)
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.error(f"❌ Failed to connect, return code {rc}")
+            return
+        logger.info(f"✅ Connected to MQTT Broker: {self.broker}:{self.port}")
+        client.subscribe([(self.topic_prefix + topic, 1) for topic in self.topics])
+
+    def on_message(self, client, userdata, message):
+        topic = message.topic
+        # 存相對主題，重播時可換成另一個前綴
+        if self.topic_prefix and topic.startswith(self.topic_prefix):
+            topic = topic[len(self.topic_prefix):]
+        self.writer.append(topic, message.payload, message.qos)
+
+    def run(self, duration):
+        logger.info(f"🔴 Recording {', '.join(self.topics)} to {self.writer.log_dir}")
+        self.client.connect(self.broker, self.port)
+        self.client.loop_start()
+        start = time.monotonic()
+        try:
+            while duration <= 0 or time.monotonic() - start < duration:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            logger.warning("\n⚠️ Interrupted by user")
+        finally:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.writer.close()
+        logger.info(f"✅ Recorded {self.writer.records} messages ({self.writer.bytes} bytes) "
+                    f"in {time.monotonic() - start:.1f}s")
+
+
+# ==================== 讀取 ====================
+
+def list_segments(log_dir):
+    return sorted(glob.glob(os.path.join(log_dir, 'segment-*.mzlog')))
+
+
+def read_segment(path):
+    """以記憶體映射逐筆產出 (到達時間秒, topic, payload, qos)"""
+    if os.path.getsize(path) <= _FILE_HEADER.size:
+        return
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, version = _FILE_HEADER.unpack_from(mm, 0)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError(f"not a traffic log segment: {path}")
+
+        offset = _FILE_HEADER.size
+        end = len(mm)
+        while offset + _RECORD.size <= end:
+            arrival, qos, topic_length, payload_length = _RECORD.unpack_from(mm, offset)
+            offset += _RECORD.size
+            if offset + topic_length + payload_length > end:
+                break  # 錄製中斷造成的不完整記錄
+            topic = mm[offset:offset + topic_length].decode('utf-8')
+            offset += topic_length
+            payload = mm[offset:offset + payload_length]
+            offset += payload_length
+            yield arrival / 1_000_000, topic, payload, qos
+
+
+def read_log(log_dir):
+    for path in list_segments(log_dir):
+        yield from read_segment(path)
+
+
+# ==================== 設備 ID ====================
+
+def device_ids(topic, payload):
+    """取出消息所屬的設備 ID (可能多個，例如 bundle)"""
+    found = _DEVICE_TOPIC.match(topic)
+    if found:
+        return [found.group(1)]
+    if topic == TOPIC_BUNDLE:
+        return [record.device_id for record in decode_bundle(payload)[1]]
+    if payload.startswith(b'{'):
+        try:
+            device_id = json.loads(payload).get('deviceId')
+        except (ValueError, AttributeError):
+            return []
+        return [device_id] if device_id else []
+    found = _COT_UID.search(payload[:512].decode('utf-8', 'replace'))
+    return [found.group(1)] if found else []
+
+
+def rewrite_device(topic, payload, suffix):
+    """把消息中的設備 ID 加上後綴；無法辨識的格式返回 None"""
+    found = _DEVICE_TOPIC.match(topic)
+    if found:
+        device_id = found.group(1)
+        topic = f"device/{device_id}{suffix}/" + topic[found.end():]
+
+    if topic == TOPIC_BUNDLE:
+        timestamp, records = decode_bundle(payload)
+        records = [r._replace(device_id=r.device_id + suffix) for r in records]
+        return topic, encode_bundle(records, timestamp)
+
+    if payload.startswith(b'{'):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return None
+        if 'deviceId' in data:
+            data['deviceId'] = f"{data['deviceId']}{suffix}"
+        elif not found:
+            return None
+        return topic, json.dumps(data).encode('utf-8')
+
+    if payload.startswith(b'<'):
+        text = payload.decode('utf-8')
+        if not _COT_UID.search(text):
+            return None
+        text = _COT_UID.sub(lambda m: f'uid="{m.group(1)}{suffix}"', text, count=1)
+        return topic, text.encode('utf-8')
+
+    return (topic, payload) if found else None
+
+
+# ==================== 重播 ====================
+
+def replay(publisher, log_dir, speed=1.0, topic_filters=None, device_filters=None, multiply=1):
+    """重播日誌；speed=0 表示不等待、盡快發布，返回統計資料"""
+    segments = list_segments(log_dir)
+    if not segments:
+        logger.warning(f"⚠️ No segments found in {log_dir}")
+        return None
+
+    logger.info(f"▶️  Replaying {len(segments)} segment(s) from {log_dir} "
+                f"at {'max' if speed <= 0 else f'{speed:g}x'} speed"
+                f"{f', {multiply}x fleet' if multiply > 1 else ''}")
+
+    device_filters = set(device_filters or [])
+    stats = {'read': 0, 'published': 0, 'filtered': 0, 'skipped_copies': 0}
+    first_arrival = None
+    start = time.monotonic()
+
+    for arrival, topic, payload, qos in read_log(log_dir):
+        stats['read'] += 1
+
+        if topic_filters and not any(topic_matches(p, topic) for p in topic_filters):
+            stats['filtered'] += 1
+            continue
+        if device_filters:
+            try:
+                matched = device_filters.intersection(device_ids(topic, payload))
+            except _MALFORMED:
+                matched = False
+            if not matched:
+                stats['filtered'] += 1
+                continue
+
+        if first_arrival is None:
+            first_arrival = arrival
+        if speed > 0:
+            delay = (arrival - first_arrival) / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        publisher._publish(topic, payload, qos)
+        stats['published'] += 1
+
+        for copy in range(1, multiply):
+            try:
+                rewritten = rewrite_device(topic, payload, f"-r{copy}")
+            except _MALFORMED:
+                rewritten = None
+            if rewritten is None:
+                stats['skipped_copies'] += 1
+                continue
+            publisher._publish(rewritten[0], rewritten[1], qos)
+            stats['published'] += 1
+
+    elapsed = time.monotonic() - start
+    stats['elapsed'] = round(elapsed, 2)
+    stats['rate'] = round(stats['published'] / elapsed, 1) if elapsed > 0 else 0.0
+    logger.info(f"✅ Replay completed: {stats['published']} published of {stats['read']} read "
+                f"({stats['filtered']} filtered) in {elapsed:.1f}s, {stats['rate']} msg/s")
+    return stats